@@ -1,5 +1,4 @@
-from raincloud.shared import scrape_client_id
-from raincloud import SCTrack
+from raincloud.daemon import run_job
 import argparse
 
 parser = argparse.ArgumentParser(
@@ -8,7 +7,7 @@ parser = argparse.ArgumentParser(
 )
 parser.add_argument('url')
 args = parser.parse_args()
-cid = open('client_id.txt').read()
-t = SCTrack(cid, args.url)
 
-print(t.stream_url)
+# goes through the raincloud daemon if it's running, otherwise does it in-process
+result = run_job("stream_url", url=args.url)
+print(result.get("stream_url") or "\n".join(result["stream_urls"]))
@@ -1,3 +1,25 @@
 from .raincloud import SCTrack, SCSet
 from .shared import scrape_client_id, DownloadedTrack
-from .exceptions import SCClientIDError, TrackSetMismatchError
+from .transcoding import Transcoding, select_transcoding
+from .hls import HLSPlaylist
+from .buffers import set_memory_budget, get_memory_budget
+from .records import TrackRecord
+from .collection import SCLikes, SCUserTracks, SCReposts
+from .library import Library
+from .progress import ProgressEvent, TqdmProgress, log_progress
+from .scheduler import DownloadScheduler, get_scheduler, set_scheduler, INTERACTIVE, BULK
+from .daemon import DaemonClient, run_job
+from .postprocess import PostProcessor
+from .negcache import NegativeCache, get_negative_cache, set_negative_cache
+from .exceptions import (
+    RaincloudError,
+    SCClientIDError,
+    TrackSetMismatchError,
+    TrackUnavailableError,
+    TrackNotFoundError,
+    TrackBlockedError,
+    NoTranscodingError,
+    EncryptedStreamError,
+    DownloadFailedError,
+    KnownBadTrackError,
+)
@@ -0,0 +1,7 @@
+"""python -m raincloud: runs the daemon, see daemon.py"""
+
+from .daemon import main
+
+# guarded: the PostProcessor's worker processes import this module too
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,143 @@
+"""
+memory budget for download buffers
+----
+when several downloads run at once each one holds its whole track in memory, so RAM grows with
+track length * concurrency. DownloadBuffer is a spooled temp file that reserves memory from a process-wide
+MemoryBudget as it grows (up to spill_threshold). if the budget has no room within a short wait it spills to
+disk instead of blocking, and it gives the reservation back once it spills, is closed, or trim()s it down to
+what it actually holds when the download is done.
+
+set_memory_budget: change the global budget / per-track threshold
+get_memory_budget: the global MemoryBudget
+"""
+
+import tempfile
+import threading
+import weakref
+
+DEFAULT_TOTAL = 256 * 1024 * 1024  # 256 MB for all in-flight buffers
+DEFAULT_SPILL_THRESHOLD = 32 * 1024 * 1024  # a single track goes to disk above 32 MB
+GROW_STEP = 1024 * 1024  # smallest reservation a buffer takes, so small writes don't hit the lock every time
+
+
+class MemoryBudget:
+    """Counts bytes reserved by in-memory buffers. acquire blocks until there's room."""
+
+    def __init__(self, total: int = DEFAULT_TOTAL, spill_threshold: int = DEFAULT_SPILL_THRESHOLD):
+        self.total = total
+        self.spill_threshold = min(spill_threshold, total)
+        self.used = 0
+        self._cond = threading.Condition()
+
+    def acquire(self, n: int, timeout: float | None = None) -> int:
+        """Reserves n bytes (clamped to total), returns how many were reserved. 0 if it timed out."""
+        n = min(n, self.total)
+        with self._cond:
+            if not self._cond.wait_for(lambda: self.used + n <= self.total, timeout):
+                return 0
+            self.used += n
+        return n
+
+    def release(self, n: int) -> None:
+        with self._cond:
+            self.used = max(0, self.used - n)
+            self._cond.notify_all()
+
+    @property
+    def available(self) -> int:
+        return self.total - self.used
+
+    def __repr__(self) -> str:
+        return "MemoryBudget({}/{} mb used)".format(
+            round(self.used / 1000000, 2), round(self.total / 1000000, 2)
+        )
+
+
+_budget = MemoryBudget()
+
+
+def get_memory_budget() -> MemoryBudget:
+    return _budget
+
+
+def set_memory_budget(total: int = DEFAULT_TOTAL, spill_threshold: int = DEFAULT_SPILL_THRESHOLD) -> MemoryBudget:
+    """Replaces the global budget. Buffers that already exist keep their old reservation."""
+    global _budget
+    _budget = MemoryBudget(total, spill_threshold)
+    return _budget
+
+
+def _give_back(budget: MemoryBudget, held: list[int]) -> None:
+    budget.release(held[0])
+    held[0] = 0
+
+
+class DownloadBuffer(tempfile.SpooledTemporaryFile):
+    """A SpooledTemporaryFile counted against a MemoryBudget. Stays in memory up to the budget's
+    spill_threshold, reserving as it grows, then rolls over to a temp file on disk and frees its reservation.
+    wait is how long a write waits for the budget before going to disk instead."""
+
+    def __init__(self, budget: MemoryBudget | None = None, wait: float = 1.0):
+        self._budget = budget or get_memory_budget()
+        self._wait = wait
+        self._held = [0]  # a list so the finalizer sees it grow
+        # max_size=0 would mean "never roll over", so a zero threshold goes straight to disk below
+        super().__init__(max_size=max(self._budget.spill_threshold, 1), mode="w+b")
+        self._release = weakref.finalize(self, _give_back, self._budget, self._held)
+        if self._budget.spill_threshold == 0:
+            self.rollover()
+
+    def _reserve(self, end: int) -> bool:
+        """Makes sure end bytes are reserved, growing the reservation by doubling. False means go to disk."""
+        held = self._held[0]
+        if end <= held:
+            return True
+        want = min(max(end, 2 * held, GROW_STEP), self._budget.spill_threshold)
+        if want < end:
+            return False  # past the threshold anyway
+        got = self._budget.acquire(want - held, self._wait)
+        if got < want - held:
+            self._budget.release(got)
+            return False
+        self._held[0] = want
+        return True
+
+    def write(self, s) -> int:
+        if not self._rolled and not self._reserve(self._file.tell() + len(s)):
+            self.rollover()
+        return super().write(s)
+
+    def writelines(self, lines) -> None:
+        for line in lines:
+            self.write(line)
+
+    def trim(self) -> None:
+        """Shrinks the reservation to the bytes actually held, call it once nothing more gets written."""
+        if self._rolled:
+            return
+        size = self.nbytes
+        if size < self._held[0]:
+            self._budget.release(self._held[0] - size)
+            self._held[0] = size
+
+    def rollover(self) -> None:
+        if self._rolled:
+            return
+        super().rollover()
+        self._release()  # on disk now, give the memory back
+
+    def close(self) -> None:
+        super().close()
+        self._release()
+
+    @property
+    def on_disk(self) -> bool:
+        return self._rolled
+
+    @property
+    def nbytes(self) -> int:
+        pos = self.tell()
+        self.seek(0, 2)
+        size = self.tell()
+        self.seek(pos)
+        return size
@@ -0,0 +1,146 @@
+"""
+paginated collections: a user's likes, uploads and reposts
+----
+these can have tens of thousands of entries, SC hands them out in pages linked by next_href. everything here is a
+generator: pages are fetched as you iterate (the next one is prefetched in the background while the current one is
+used), so downloads can start before the whole listing is known and memory doesn't grow with the collection.
+
+SCLikes, SCUserTracks, SCReposts: take a user URL (https://soundcloud.com/someone, /likes etc. on the end is fine)
+
+    for track in SCLikes(client_id, "https://soundcloud.com/someone/likes"):
+        track.stream_download().write_to_file()
+"""
+
+from typing import Iterator
+from concurrent.futures import ThreadPoolExecutor
+
+from .raincloud import SCBase, SCTrack
+from .records import TrackRecord
+from .shared import prefetched, session
+from .transcoding import PROGRESSIVE_FIRST
+
+SUFFIXES = ("/likes", "/tracks", "/reposts")
+
+
+class SCCollection(SCBase):
+    """Base class for paginated track collections of a user. Subclasses set `endpoint` and maybe override `track_of`.
+
+    Arguments
+    ----
+    client_id: a valid soundcloud client ID
+    sc_url: the user URL
+    transcoding_policy: passed to every SCTrack
+    keep_raw: keep the full JSON in each TrackRecord
+    page_size: entries per request, SC caps this at 200
+
+    Methods
+    ----
+    pages: generator of raw pages (lists of collection entries)
+    iter_records: generator of TrackRecords
+    iter_tracks: generator of SCTracks, also what iterating the collection does
+    """
+
+    endpoint = ""  # formatted with the user id
+
+    def __init__(
+        self,
+        client_id: str,
+        sc_url: str,
+        transcoding_policy: str = PROGRESSIVE_FIRST,
+        keep_raw: bool = False,
+        page_size: int = 200,
+    ):
+        sc_url = sc_url.rstrip("/")
+        for suffix in SUFFIXES:
+            sc_url = sc_url.removesuffix(suffix)
+        super().__init__(client_id, sc_url, keep_raw)
+        self.transcoding_policy = transcoding_policy
+        self.page_size = page_size
+
+    @property
+    def user_id(self) -> int:
+        return self.resolved["id"]
+
+    @property
+    def title(self) -> str:
+        return self.resolved["username"]
+
+    @property
+    def artist(self) -> str:
+        return self.resolved["username"]
+
+    @property
+    def artwork_url(self) -> str:
+        return self.resolved["avatar_url"]
+
+    def _get_page(self, href: str) -> dict:
+        response = session.get(
+            href,
+            params={"client_id": self.client_id},  # next_href already has limit/offset in it
+            headers=self.default_headers,
+        )
+        response.raise_for_status()
+        return response.json()
+
+    def pages(self) -> Iterator[list[dict]]:
+        first = "{}{}?limit={}&linked_partitioning=1".format(
+            self.api_url, self.endpoint.format(user_id=self.user_id), self.page_size
+        )
+        with ThreadPoolExecutor(max_workers=1) as pool:
+            future = pool.submit(self._get_page, first)
+            while future is not None:
+                page = future.result()
+                next_href = page.get("next_href")
+                # kick off the next page before handing this one out
+                future = pool.submit(self._get_page, next_href) if next_href and page["collection"] else None
+                yield page["collection"]
+
+    def track_of(self, entry: dict) -> dict | None:
+        """The track JSON in a collection entry, None for entries that aren't tracks (liked playlists etc.)"""
+        if entry.get("kind") == "track":
+            return entry
+        return None
+
+    def iter_records(self) -> Iterator[TrackRecord]:
+        def page_records(page: list[dict]) -> list[TrackRecord]:
+            return self.complete_records([t for t in map(self.track_of, page) if t is not None])
+
+        # completing id-only entries of one page overlaps with the caller using the previous one
+        for records in prefetched(page_records, self.pages()):
+            yield from records
+
+    def iter_tracks(self) -> Iterator[SCTrack]:
+        for r in self.iter_records():
+            yield SCTrack.from_record(self.client_id, r, self.transcoding_policy)
+
+    def __iter__(self) -> Iterator[SCTrack]:
+        return self.iter_tracks()
+
+    def __repr__(self) -> str:
+        return "{}({})".format(type(self).__name__, self.params["url"])
+
+
+class SCLikes(SCCollection):
+    """Tracks a user liked, newest first."""
+
+    endpoint = "/users/{user_id}/likes"
+
+    def track_of(self, entry: dict) -> dict | None:
+        return entry.get("track")  # liked playlists have 'playlist' instead
+
+
+class SCUserTracks(SCCollection):
+    """Tracks a user uploaded."""
+
+    endpoint = "/users/{user_id}/tracks"
+
+
+class SCReposts(SCCollection):
+    """Tracks a user reposted."""
+
+    endpoint = "/stream/users/{user_id}/reposts"
+
+    def track_of(self, entry: dict) -> dict | None:
+        if entry.get("type") == "track-repost":
+            return entry.get("track")
+        return None
@@ -0,0 +1,465 @@
+"""
+long-running raincloud daemon with a local job API
+----
+every run of the CLI / GETSTREAMURL / the streamlit app pays for interpreter startup, client_id validation, cold
+connections and empty caches. the daemon keeps all of that warm in one process and takes jobs over localhost HTTP.
+
+    python -m raincloud [--port 8765]
+
+(that's raincloud/__main__.py. not python -m raincloud.daemon, the package __init__ already imports this module
+so it would run a second copy of it)
+
+API (JSON, bound to 127.0.0.1 only). requests need a localhost Host header (no DNS rebinding), no foreign Origin,
+and POSTs need Content-Type: application/json, so web pages open in a browser can't submit jobs. download dirs
+have to be inside one of the daemon's download roots (--download-root, home and the temp dir by default).
+
+* GET  /ping            -> {"ok": true}
+* POST /jobs            {"kind": "resolve" | "stream_url" | "download", "url": ..., plus kind-specific options}
+                        -> {"id": ...}
+* GET  /jobs/<id>       -> {"id", "kind", "status": "queued" | "running" | "done" | "error", "result", "error"}
+* GET  /jobs            -> every job
+
+job options: "format" (transcoding policy) for all kinds, "dir", "metadata" and "connections" for downloads.
+unavailable tracks in sets/collections are skipped (and remembered, see negcache.py), a single unavailable
+track makes its job fail with the TrackUnavailableError.
+
+DaemonClient talks to it, run_job submits to the daemon if one is running and otherwise runs the job in-process
+on a JobRunner kept for the life of the process (local_runner), so the entry points work the same either way.
+"""
+
+import argparse
+import itertools
+import json
+import os
+import tempfile
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import requests
+
+from .exceptions import DaemonJobError, SCClientIDError, TrackSetMismatchError, TrackUnavailableError
+from .library import Library
+from .negcache import NegativeCache, set_negative_cache
+from .postprocess import PostProcessor
+from .raincloud import SCSet, SCTrack
+from .collection import SCCollection, SCLikes, SCUserTracks, SCReposts
+from .scheduler import BULK, INTERACTIVE
+from .shared import load_client_id
+from .transcoding import PROGRESSIVE_FIRST
+
+DEFAULT_PORT = int(os.environ.get("RAINCLOUD_DAEMON_PORT", 8765))
+KINDS = ("resolve", "stream_url", "download")
+COLLECTIONS = {"/likes": SCLikes, "/tracks": SCUserTracks, "/reposts": SCReposts}
+LOCAL_HOSTS = ("127.0.0.1", "localhost")
+DEFAULT_DOWNLOAD_ROOTS = (os.path.expanduser("~"), tempfile.gettempdir())
+
+
+class JobRunner:
+    """Runs jobs, keeping the validated client_id, resolved tracks/sets and the library around between them.
+    The daemon has one for its whole life, without a daemon run_job uses local_runner's."""
+
+    def __init__(
+        self,
+        client_id: str | None = None,
+        library_path: str = "library.db",
+        cache_size: int = 512,
+        listing_ttl: float = 60.0,
+    ):
+        self._client_id = client_id
+        self._lock = threading.Lock()
+        self.cache_size = cache_size
+        # sets and collections change (that's the point of mirroring them), so they're only reused for a short
+        # while, e.g. between the resolve and download jobs of one CLI run. tracks are kept until evicted
+        self.listing_ttl = listing_ttl
+        # (url, format) -> (object, when it was resolved)
+        self.resolved: OrderedDict[tuple[str, str], tuple[SCTrack | SCSet | SCCollection, float]] = OrderedDict()
+        self.library_path = library_path
+        self._library: Library | None = None
+        self._postprocessor: PostProcessor | None = None
+
+    @property
+    def client_id(self) -> str:
+        with self._lock:
+            if self._client_id is None:
+                self._client_id = load_client_id()
+            return self._client_id
+
+    def invalidate_client_id(self) -> None:
+        with self._lock:
+            self._client_id = None
+            self.resolved.clear()  # they all hold the old client_id
+
+    @property
+    def library(self) -> Library:
+        # under the lock: the daemon's job threads all get here on their first job
+        with self._lock:
+            if self._library is None:
+                self._library = Library(self.library_path)
+            return self._library
+
+    @property
+    def postprocessor(self) -> PostProcessor:
+        # tagging for set downloads, in its own processes so it doesn't hold up the download threads
+        with self._lock:
+            if self._postprocessor is None:
+                self._postprocessor = PostProcessor()
+            return self._postprocessor
+
+    def lookup(self, url: str, format: str = PROGRESSIVE_FIRST) -> SCTrack | SCSet | SCCollection:
+        key = (url, format)
+        with self._lock:
+            if key in self.resolved:
+                sc, since = self.resolved[key]
+                if isinstance(sc, SCTrack) or time.monotonic() - since < self.listing_ttl:
+                    self.resolved.move_to_end(key)
+                    return sc
+                del self.resolved[key]
+        collection_cls = next((c for suffix, c in COLLECTIONS.items() if url.rstrip("/").endswith(suffix)), None)
+        if collection_cls is not None:
+            sc = collection_cls(self.client_id, url, format)
+        else:
+            try:
+                sc = SCTrack(self.client_id, url, format)
+            except TrackSetMismatchError:
+                sc = SCSet(self.client_id, url, format)
+        with self._lock:
+            self.resolved[key] = (sc, time.monotonic())
+            while len(self.resolved) > self.cache_size:
+                self.resolved.popitem(last=False)
+        return sc
+
+    def _run(self, kind: str, params: dict) -> dict:
+        url = params["url"]
+        sc = self.lookup(url, params.get("format", PROGRESSIVE_FIRST))
+
+        if kind == "resolve":
+            if isinstance(sc, SCCollection):
+                return {"kind": "collection", "title": sc.title}
+            if isinstance(sc, SCSet):
+                return {
+                    "kind": "set",
+                    "title": sc.title,
+                    "artist": sc.artist,
+                    "tracks": [{"id": r.id, "title": r.title, "artist": r.artist, "permalink": r.permalink} for r in sc.records],
+                }
+            r = sc.record
+            return {
+                "kind": "track",
+                "id": r.id,
+                "title": r.title,
+                "artist": r.artist,
+                "permalink": r.permalink,
+                "artwork_url": r.artwork_url,
+                "duration": r.duration,
+                "estimated_size": sc.estimated_size,
+            }
+
+        if kind == "stream_url":
+            if isinstance(sc, SCCollection):
+                raise ValueError("stream_url jobs don't work on collections, they can be huge")
+            if isinstance(sc, SCSet):
+                stream_urls = []
+                for track in sc.tracks:
+                    try:
+                        stream_urls.append(track.stream_url)
+                    except TrackUnavailableError:
+                        continue
+                return {"stream_urls": stream_urls}
+            return {"stream_url": sc.stream_url}
+
+        if kind == "download":
+            dir = params.get("dir") or os.getcwd()
+            metadata = params.get("metadata", True)
+            os.makedirs(dir, exist_ok=True)
+            if isinstance(sc, SCSet):
+                return {
+                    "paths": sc.download_all(
+                        dir, metadata, self.library, priority=BULK, postprocessor=self.postprocessor
+                    )
+                }
+            if isinstance(sc, SCCollection):
+                paths = []
+                for track in sc:
+                    if self.library.has(track.record.id):
+                        continue
+                    try:
+                        dt = track.stream_download(metadata, priority=BULK, job=url)
+                    except TrackUnavailableError:
+                        continue
+                    paths.append(dt.write_to_file(dir, self.library))
+                    dt.close()
+                return {"paths": paths}
+            if self.library.has(sc.record.id):
+                return {"paths": [self.library.get(sc.record.id).path], "cached": True}
+            dt = sc.stream_download(metadata, priority=INTERACTIVE, connections=params.get("connections", 1))
+            try:
+                return {"paths": [dt.write_to_file(dir, self.library)]}
+            finally:
+                dt.close()
+
+        raise ValueError("unknown job kind {!r}, expected one of {}".format(kind, KINDS))
+
+    def run(self, kind: str, params: dict) -> dict:
+        try:
+            return self._run(kind, params)
+        except SCClientIDError:
+            # client_ids go stale every now and then, get a new one and try once more
+            self.invalidate_client_id()
+            return self._run(kind, params)
+
+
+class Job:
+    def __init__(self, id: str, kind: str, params: dict):
+        self.id = id
+        self.kind = kind
+        self.params = params
+        self.status = "queued"
+        self.result: dict | None = None
+        self.error: str | None = None
+        self.reason: str | None = None  # TrackUnavailableError.reason when that's the error
+        self.created = time.time()
+        self.finished: float | None = None
+
+    def to_json(self) -> dict:
+        return {
+            "id": self.id,
+            "kind": self.kind,
+            "params": self.params,
+            "status": self.status,
+            "result": self.result,
+            "error": self.error,
+            "reason": self.reason,
+            "created": self.created,
+            "finished": self.finished,
+        }
+
+
+def _hostname(value: str) -> str:
+    # "127.0.0.1:8765" / "http://localhost:8765" -> host
+    value = value.split("://", 1)[-1]
+    return value.rsplit(":", 1)[0] if value.count(":") == 1 else value
+
+
+class RaincloudDaemon:
+    def __init__(
+        self,
+        port: int = DEFAULT_PORT,
+        workers: int = 4,
+        runner: JobRunner | None = None,
+        download_roots: tuple[str, ...] = DEFAULT_DOWNLOAD_ROOTS,
+        job_ttl: float = 60 * 60,
+        max_jobs: int = 1000,
+    ):
+        self.port = port
+        self.runner = runner or JobRunner()
+        self.download_roots = [os.path.realpath(root) for root in download_roots]
+        self.pool = ThreadPoolExecutor(max_workers=workers)
+        self.jobs: dict[str, Job] = {}  # oldest first
+        # finished jobs are kept job_ttl seconds for clients to pick up, and at most max_jobs of them
+        self.job_ttl = job_ttl
+        self.max_jobs = max_jobs
+        self._ids = itertools.count(1)
+        self._lock = threading.Lock()
+        self.server = ThreadingHTTPServer(("127.0.0.1", port), self._handler())
+
+    def submit(self, kind: str, params: dict) -> Job:
+        if kind not in KINDS:
+            raise ValueError("unknown job kind {!r}, expected one of {}".format(kind, KINDS))
+        if "url" not in params:
+            raise ValueError("job needs a url")
+        if kind == "download":
+            params["dir"] = self.download_dir(params.get("dir"))
+        with self._lock:
+            self._prune()
+            job = Job(str(next(self._ids)), kind, params)
+            self.jobs[job.id] = job
+        self.pool.submit(self._execute, job)
+        return job
+
+    def _prune(self) -> None:
+        # with self._lock held. queued/running jobs always stay
+        now = time.time()
+        finished = [j for j in self.jobs.values() if j.finished is not None]
+        for job in finished:
+            if now - job.finished > self.job_ttl or len(self.jobs) > self.max_jobs:
+                del self.jobs[job.id]
+
+    def job(self, job_id: str) -> Job | None:
+        with self._lock:
+            return self.jobs.get(job_id)
+
+    def all_jobs(self) -> list[Job]:
+        with self._lock:
+            return list(self.jobs.values())
+
+    def download_dir(self, dir: str | None) -> str:
+        """The real path of a requested download dir, ValueError unless it's inside a download root."""
+        path = os.path.realpath(dir or self.download_roots[0])
+        if not any(os.path.commonpath([path, root]) == root for root in self.download_roots):
+            raise ValueError("{} is outside the download roots {}".format(path, self.download_roots))
+        return path
+
+    def _execute(self, job: Job) -> None:
+        job.status = "running"
+        try:
+            job.result = self.runner.run(job.kind, job.params)
+            job.status = "done"
+        except Exception as e:
+            job.error = "{}: {}".format(type(e).__name__, e)
+            job.reason = e.reason if isinstance(e, TrackUnavailableError) else None
+            job.status = "error"
+        job.finished = time.time()
+
+    def _handler(self) -> type:
+        daemon = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def _reply(self, code: int, body) -> None:
+                data = json.dumps(body).encode()
+                self.send_response(code)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(data)))
+                self.end_headers()
+                self.wfile.write(data)
+
+            def _allowed(self) -> bool:
+                # only local clients: a page doing DNS rebinding sends its own Host, cross-site requests an Origin
+                origin = self.headers.get("Origin")
+                if _hostname(self.headers.get("Host", "")) not in LOCAL_HOSTS or (
+                    origin is not None and _hostname(origin) not in LOCAL_HOSTS
+                ):
+                    self._reply(403, {"error": "forbidden"})
+                    return False
+                return True
+
+            def do_GET(self) -> None:
+                if not self._allowed():
+                    return
+                parts = self.path.strip("/").split("/")
+                if parts == ["ping"]:
+                    self._reply(200, {"ok": True})
+                elif parts == ["jobs"]:
+                    self._reply(200, [j.to_json() for j in daemon.all_jobs()])
+                elif len(parts) == 2 and parts[0] == "jobs" and (job := daemon.job(parts[1])) is not None:
+                    self._reply(200, job.to_json())
+                else:
+                    self._reply(404, {"error": "not found"})
+
+            def do_POST(self) -> None:
+                if not self._allowed():
+                    return
+                if self.path.strip("/") != "jobs":
+                    self._reply(404, {"error": "not found"})
+                    return
+                # a <form> or text/plain fetch can't send this without a CORS preflight, which we never answer
+                if self.headers.get("Content-Type", "").split(";")[0].strip() != "application/json":
+                    self._reply(415, {"error": "expected application/json"})
+                    return
+                try:
+                    body = json.loads(self.rfile.read(int(self.headers.get("Content-Length", 0))) or b"{}")
+                    job = daemon.submit(body.pop("kind", ""), body)
+                except (ValueError, AttributeError) as e:
+                    self._reply(400, {"error": str(e)})
+                    return
+                self._reply(202, {"id": job.id})
+
+            def log_message(self, format, *args) -> None:
+                pass  # keep the terminal quiet
+
+        return Handler
+
+    def serve_forever(self) -> None:
+        print("raincloud daemon listening on 127.0.0.1:{}".format(self.port))
+        try:
+            self.server.serve_forever()
+        finally:
+            self.pool.shutdown(wait=False)
+
+    def shutdown(self) -> None:
+        self.server.shutdown()
+        self.server.server_close()
+
+
+class DaemonClient:
+    """Thin client for a running daemon."""
+
+    def __init__(self, port: int = DEFAULT_PORT):
+        self.base = "http://127.0.0.1:{}".format(port)
+        self.http = requests.Session()
+
+    def available(self) -> bool:
+        try:
+            return self.http.get(f"{self.base}/ping", timeout=0.5).ok
+        except requests.exceptions.RequestException:
+            return False
+
+    def submit(self, kind: str, **params) -> str:
+        response = self.http.post(f"{self.base}/jobs", json={"kind": kind, **params})
+        if response.status_code == 400:
+            raise ValueError(response.json()["error"])
+        response.raise_for_status()
+        return response.json()["id"]
+
+    def status(self, job_id: str) -> dict:
+        response = self.http.get(f"{self.base}/jobs/{job_id}")
+        response.raise_for_status()
+        return response.json()
+
+    def wait(self, job_id: str, poll: float = 0.25) -> dict:
+        """Polls until the job is finished, returns its result or raises DaemonJobError."""
+        while True:
+            job = self.status(job_id)
+            if job["status"] == "done":
+                return job["result"]
+            if job["status"] == "error":
+                raise DaemonJobError(job["error"], job.get("reason"))
+            time.sleep(poll)
+
+
+_local_runners: dict[str, JobRunner] = {}
+_local_lock = threading.Lock()
+
+
+def local_runner(library_path: str = "library.db") -> JobRunner:
+    """The in-process JobRunner run_job falls back to, one per library for the life of the process,
+    so its validated client_id and resolved tracks carry over between jobs (e.g. resolve then download)."""
+    with _local_lock:
+        if library_path not in _local_runners:
+            _local_runners[library_path] = JobRunner(library_path=library_path)
+        return _local_runners[library_path]
+
+
+def run_job(
+    kind: str, use_daemon: bool = True, port: int = DEFAULT_PORT, library_path: str = "library.db", **params
+) -> dict:
+    """Runs a job on the daemon if one is up, otherwise in this process. Same result either way
+    (library_path only matters in-process, the daemon uses its own library)."""
+    if use_daemon:
+        client = DaemonClient(port)
+        if client.available():
+            return client.wait(client.submit(kind, **params))
+    return local_runner(library_path).run(kind, params)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="raincloud daemon, keeps sessions and caches warm for the CLI/apps")
+    parser.add_argument("--port", type=int, default=DEFAULT_PORT)
+    parser.add_argument("--workers", type=int, default=4, help="jobs running at once")
+    parser.add_argument("--library", type=str, default="library.db")
+    parser.add_argument(
+        "--download-root",
+        action="append",
+        help="directory download jobs may write under (repeatable), default: home and the temp dir",
+    )
+    parser.add_argument("--negative-cache", type=str, default="negative_cache.json", help="remembered unavailable tracks")
+    args = parser.parse_args()
+
+    set_negative_cache(NegativeCache(args.negative_cache))
+
+    runner = JobRunner(library_path=args.library)
+    runner.client_id  # validate up front so the first job doesn't pay for it
+    RaincloudDaemon(args.port, args.workers, runner, tuple(args.download_root or DEFAULT_DOWNLOAD_ROOTS)).serve_forever()
+
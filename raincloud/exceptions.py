@@ -1,4 +1,61 @@
-class SCClientIDError(Exception): pass
+class RaincloudError(Exception): pass
 
 
-class TrackSetMismatchError(Exception): pass
+class SCClientIDError(RaincloudError): pass
+
+
+class TrackSetMismatchError(RaincloudError): pass
+
+
+class DaemonJobError(RaincloudError):
+    """A daemon job failed. reason is the TrackUnavailableError reason if that's what failed it, else None."""
+
+    def __init__(self, message: str = "", reason: str | None = None):
+        super().__init__(message)
+        self.reason = reason
+
+
+class TrackUnavailableError(RaincloudError):
+    """Something about one track that stops it from being downloaded. `reason` is what the negative cache
+    records, track_id/url say which track (either can be None, the cache only keeps ones with a track_id).
+    Only `cacheable` ones are verdicts about the track itself that won't fix themselves by retrying, the others
+    are about this attempt."""
+
+    reason = "unavailable"
+    cacheable = True
+
+    def __init__(self, message: str = "", track_id: int | None = None, url: str | None = None):
+        super().__init__(message)
+        self.track_id = track_id
+        self.url = url
+
+
+class TrackNotFoundError(TrackUnavailableError):
+    reason = "not_found"  # removed, private, or a bad URL
+
+
+class TrackBlockedError(TrackUnavailableError):
+    reason = "blocked"  # geo-blocked or otherwise not streamable from here
+
+
+class NoTranscodingError(TrackUnavailableError):
+    reason = "no_transcoding"
+
+
+class EncryptedStreamError(NoTranscodingError):
+    reason = "encrypted"  # the HLS playlist has an #EXT-X-KEY, we'd only get ciphertext
+
+
+class DownloadFailedError(TrackUnavailableError):
+    reason = "download_failed"
+    cacheable = False  # network trouble, the next try may well work
+
+
+class IncompleteDownloadError(DownloadFailedError): pass
+
+
+class KnownBadTrackError(TrackUnavailableError):
+    """Raised instead of trying again when the negative cache already has a failure for the track."""
+
+    reason = "known_bad"
+    cacheable = False  # already in there
@@ -0,0 +1,154 @@
+"""
+m3u8 playlist stuff for HLS transcodings
+----
+HLSPlaylist.parse: turns a media playlist (the thing the HLS stream_url points to) into segments, with
+durations from #EXTINF, byte ranges from #EXT-X-BYTERANGE, the #EXT-X-MAP init segment and relative URIs resolved.
+encrypted playlists (#EXT-X-KEY with a METHOD other than NONE) raise EncryptedStreamError, we can't decrypt them
+
+HLSPlaylist.requests: the HTTP requests needed to fetch the playlist, where byte ranges of the same file that
+sit next to each other are merged into one ranged request
+
+HLSPlaylist.slice: a playlist with only the segments covering a time range, for partial downloads
+"""
+
+from dataclasses import dataclass, field
+from urllib.parse import urljoin
+import re
+
+from .exceptions import EncryptedStreamError
+
+
+@dataclass(slots=True, frozen=True)
+class HLSSegment:
+    uri: str  # absolute
+    duration: float = 0.0  # seconds, 0 for the init segment
+    byterange: tuple[int, int] | None = None  # (offset, length)
+
+
+@dataclass(slots=True, frozen=True)
+class HLSRequest:
+    """One HTTP request, if start is None it's the whole resource. end is inclusive like the Range header."""
+
+    uri: str
+    start: int | None = None
+    end: int | None = None
+
+    @property
+    def headers(self) -> dict:
+        if self.start is None:
+            return {}
+        return {"Range": f"bytes={self.start}-{self.end}"}
+
+
+def _parse_byterange(value: str, next_offset: int) -> tuple[int, int]:
+    # <length>[@<offset>], without an offset the range starts right after the previous one
+    length, _, offset = value.strip().strip('"').partition("@")
+    return (int(offset) if offset else next_offset, int(length))
+
+
+def _parse_attributes(value: str) -> dict[str, str]:
+    return {
+        k: v.strip('"')
+        for k, v in re.findall(r'([A-Z0-9-]+)=("[^"]*"|[^,]*)', value)
+    }
+
+
+@dataclass
+class HLSPlaylist:
+    segments: list[HLSSegment] = field(default_factory=list)
+    init_segment: HLSSegment | None = None
+    target_duration: float = 0.0
+
+    @classmethod
+    def parse(cls, text: str, base_url: str = "") -> "HLSPlaylist":
+        playlist = cls()
+        duration = 0.0
+        byterange = None
+        next_offsets: dict[str, int] = {}  # end of the last range per uri, for BYTERANGE without @offset
+
+        for line in text.splitlines():
+            line = line.strip()
+            if not line:
+                continue
+            if line.startswith("#EXTINF:"):
+                duration = float(line[len("#EXTINF:"):].split(",")[0])
+            elif line.startswith("#EXT-X-BYTERANGE:"):
+                byterange = line[len("#EXT-X-BYTERANGE:"):]
+            elif line.startswith("#EXT-X-TARGETDURATION:"):
+                playlist.target_duration = float(line[len("#EXT-X-TARGETDURATION:"):])
+            elif line.startswith("#EXT-X-MAP:"):
+                attrs = _parse_attributes(line[len("#EXT-X-MAP:"):])
+                uri = urljoin(base_url, attrs["URI"])
+                init_range = None
+                if "BYTERANGE" in attrs:
+                    init_range = _parse_byterange(attrs["BYTERANGE"], 0)
+                    next_offsets[uri] = sum(init_range)
+                playlist.init_segment = HLSSegment(uri, 0.0, init_range)
+            elif line.startswith("#EXT-X-KEY:"):
+                method = _parse_attributes(line[len("#EXT-X-KEY:"):]).get("METHOD", "NONE")
+                if method != "NONE":
+                    raise EncryptedStreamError("HLS playlist {} is encrypted (METHOD={})".format(base_url, method))
+            elif line.startswith("#"):
+                continue  # other tags/comments we don't care about
+            else:
+                uri = urljoin(base_url, line)
+                segment_range = None
+                if byterange is not None:
+                    segment_range = _parse_byterange(byterange, next_offsets.get(uri, 0))
+                    next_offsets[uri] = sum(segment_range)
+                playlist.segments.append(HLSSegment(uri, duration, segment_range))
+                duration = 0.0
+                byterange = None
+
+        return playlist
+
+    @property
+    def total_duration(self) -> float:
+        return sum(s.duration for s in self.segments)
+
+    @property
+    def durations(self) -> list[float]:
+        return [s.duration for s in self.segments]
+
+    def slice(self, start: float | None = None, end: float | None = None) -> "HLSPlaylist":
+        """Only the segments overlapping [start, end) seconds. The init segment is always kept.
+        ValueError if no segment overlaps, e.g. a start past the end of the track."""
+        start = 0.0 if start is None else start
+        end = float("inf") if end is None else end
+        kept = []
+        t = 0.0
+        for s in self.segments:
+            if t + s.duration > start and t < end:
+                kept.append(s)
+            t += s.duration
+        if not kept:
+            # otherwise it's just the init segment, a file with no audio in it
+            raise ValueError("no segments between {}s and {}s, the playlist is {}s long".format(start, end, round(t, 2)))
+        return HLSPlaylist(kept, self.init_segment, self.target_duration)
+
+    def requests(self) -> list[HLSRequest]:
+        """The requests needed to download everything in order, adjacent byte ranges of the same file coalesced."""
+        segments = self.segments
+        if self.init_segment is not None:
+            segments = [self.init_segment] + segments
+
+        out: list[HLSRequest] = []
+        for s in segments:
+            if s.byterange is None:
+                out.append(HLSRequest(s.uri))
+                continue
+            offset, length = s.byterange
+            last = out[-1] if out else None
+            if (
+                last is not None
+                and last.start is not None
+                and last.uri == s.uri
+                and last.end + 1 == offset
+            ):
+                out[-1] = HLSRequest(s.uri, last.start, offset + length - 1)
+            else:
+                out.append(HLSRequest(s.uri, offset, offset + length - 1))
+        return out
+
+    def __len__(self) -> int:
+        return len(self.segments)
@@ -0,0 +1,196 @@
+"""
+local library index of downloaded tracks
+----
+a small SQLite database (with an FTS5 index on title/artist/sets) that DownloadedTrack.write_to_file fills in when it's
+given a Library. lets you search what you already have without re-resolving anything or reading ID3 tags, and answers
+"already have it?" before the CLI, the Qt loader or SCSet.download_all touch the network.
+
+    lib = Library("library.db")
+    lib.has("https://soundcloud.com/someone/some-track")  # or a track id
+    lib.search("artist name")
+"""
+
+import os
+import re
+import sqlite3
+import threading
+import time
+from dataclasses import dataclass
+from urllib.parse import urlsplit
+
+from .records import TrackRecord
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS tracks (
+    id INTEGER PRIMARY KEY,
+    permalink TEXT UNIQUE NOT NULL,
+    title TEXT NOT NULL,
+    artist TEXT NOT NULL,
+    path TEXT NOT NULL,
+    size INTEGER NOT NULL,
+    sha256 TEXT,
+    added REAL NOT NULL
+);
+CREATE TABLE IF NOT EXISTS set_tracks (
+    set_permalink TEXT NOT NULL,
+    set_title TEXT NOT NULL,
+    track_id INTEGER NOT NULL REFERENCES tracks(id) ON DELETE CASCADE,
+    PRIMARY KEY (set_permalink, track_id)
+);
+CREATE VIRTUAL TABLE IF NOT EXISTS tracks_fts USING fts5(title, artist, sets);
+"""
+
+
+def normalize_permalink(url: str) -> str:
+    """https://m.soundcloud.com/a/b/?in=... -> https://soundcloud.com/a/b, so user-typed URLs match stored permalinks"""
+    parts = urlsplit(url.strip())
+    path = parts.path.rstrip("/").lower()
+    return f"https://soundcloud.com{path}"
+
+
+@dataclass
+class LibraryEntry:
+    id: int
+    permalink: str
+    title: str
+    artist: str
+    path: str
+    size: int
+    sha256: str | None
+    added: float
+    sets: list[str]
+
+    @property
+    def exists(self) -> bool:
+        return os.path.exists(self.path)
+
+
+class Library:
+    """The index itself. Safe to share between threads (one connection behind a lock).
+
+    Methods
+    ----
+    add: record a downloaded file for a TrackRecord, optionally as part of a set
+    add_to_set: mark an already indexed track as belonging to a set
+    has: True if the track (id or URL) is indexed and its file is still there
+    get: the LibraryEntry for a track id or URL, or None
+    search: full text search over title, artist and set titles
+    remove: forget a track
+    """
+
+    def __init__(self, path: str = "library.db"):
+        self.path = path
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute("PRAGMA foreign_keys = ON")
+        self._conn.executescript(SCHEMA)
+
+    def close(self) -> None:
+        with self._lock:
+            self._conn.close()
+
+    def _sets_of(self, track_id: int) -> list[str]:
+        rows = self._conn.execute("SELECT set_title FROM set_tracks WHERE track_id = ?", (track_id,))
+        return [r[0] for r in rows]
+
+    def _reindex(self, track_id: int) -> None:
+        # FTS row shares the track's id as rowid, rewritten whenever the track or its sets change
+        row = self._conn.execute("SELECT title, artist FROM tracks WHERE id = ?", (track_id,)).fetchone()
+        self._conn.execute("DELETE FROM tracks_fts WHERE rowid = ?", (track_id,))
+        if row is not None:
+            self._conn.execute(
+                "INSERT INTO tracks_fts (rowid, title, artist, sets) VALUES (?, ?, ?, ?)",
+                (track_id, row[0], row[1], " ".join(self._sets_of(track_id))),
+            )
+
+    def add(
+        self,
+        record: TrackRecord,
+        path: str,
+        size: int,
+        sha256: str | None = None,
+        set_title: str | None = None,
+        set_permalink: str | None = None,
+    ) -> None:
+        permalink = normalize_permalink(record.permalink)
+        with self._lock, self._conn:
+            # an old track under the same permalink (deleted and re-uploaded) is a different track
+            self._conn.execute("DELETE FROM tracks WHERE permalink = ? AND id != ?", (permalink, record.id))
+            # upsert, not INSERT OR REPLACE: replacing deletes the row and the cascade would drop its set_tracks
+            self._conn.execute(
+                "INSERT INTO tracks (id, permalink, title, artist, path, size, sha256, added) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?, ?) "
+                "ON CONFLICT(id) DO UPDATE SET permalink = excluded.permalink, title = excluded.title, "
+                "artist = excluded.artist, path = excluded.path, size = excluded.size, sha256 = excluded.sha256, "
+                "added = excluded.added",
+                (
+                    record.id,
+                    permalink,
+                    record.title,
+                    record.artist,
+                    os.path.abspath(path),
+                    size,
+                    sha256,
+                    time.time(),
+                ),
+            )
+            if set_permalink is not None:
+                self._add_to_set(record.id, set_title or "", set_permalink)
+            self._reindex(record.id)
+
+    def _add_to_set(self, track_id: int, set_title: str, set_permalink: str) -> None:
+        self._conn.execute(
+            "INSERT OR REPLACE INTO set_tracks (set_permalink, set_title, track_id) VALUES (?, ?, ?)",
+            (normalize_permalink(set_permalink), set_title, track_id),
+        )
+
+    def add_to_set(self, track_id: int, set_title: str, set_permalink: str) -> None:
+        with self._lock, self._conn:
+            self._add_to_set(track_id, set_title, set_permalink)
+            self._reindex(track_id)
+
+    def _entry(self, row: tuple) -> LibraryEntry:
+        return LibraryEntry(*row, sets=self._sets_of(row[0]))
+
+    def get(self, track: int | str) -> LibraryEntry | None:
+        if isinstance(track, int):
+            query, key = "SELECT * FROM tracks WHERE id = ?", track
+        else:
+            query, key = "SELECT * FROM tracks WHERE permalink = ?", normalize_permalink(track)
+        with self._lock:
+            row = self._conn.execute(query, (key,)).fetchone()
+            return self._entry(row) if row is not None else None
+
+    def has(self, track: int | str, check_file: bool = True) -> bool:
+        """Already have it? Takes a track id or URL. With check_file, a deleted file counts as not having it."""
+        entry = self.get(track)
+        if entry is None:
+            return False
+        return entry.exists or not check_file
+
+    def search(self, query: str, limit: int = 50) -> list[LibraryEntry]:
+        # every word is a quoted prefix match so user input can't break the FTS syntax
+        words = re.findall(r"\w+", query)
+        if not words:
+            return []
+        match = " ".join('"{}"*'.format(w) for w in words)
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT tracks.* FROM tracks_fts JOIN tracks ON tracks.id = tracks_fts.rowid "
+                "WHERE tracks_fts MATCH ? ORDER BY rank LIMIT ?",
+                (match, limit),
+            ).fetchall()
+            return [self._entry(r) for r in rows]
+
+    def remove(self, track_id: int) -> None:
+        with self._lock, self._conn:
+            self._conn.execute("DELETE FROM tracks WHERE id = ?", (track_id,))
+            self._conn.execute("DELETE FROM set_tracks WHERE track_id = ?", (track_id,))
+            self._reindex(track_id)
+
+    def __len__(self) -> int:
+        with self._lock:
+            return self._conn.execute("SELECT COUNT(*) FROM tracks").fetchone()[0]
+
+    def __repr__(self) -> str:
+        return "Library({}, {} tracks)".format(self.path, len(self))
@@ -0,0 +1,127 @@
+"""
+negative cache for tracks that are unavailable, blocked or keep failing
+----
+sets are full of geo-blocked, removed or transcoding-less tracks, and every run used to request them again and fail
+the same way. verdicts about a track (cacheable TrackUnavailableErrors: not found, blocked, no transcodings, see
+exceptions.py) get recorded here per track id with their reason and time, and bulk jobs (set/collection listings, BULK downloads) skip them until the entry expires. network errors
+are never recorded, and interactive requests for a single track always try again.
+
+ttl is how long an entry counts, ttls overrides it per reason. with a path the cache is kept in a JSON file so it
+survives between runs.
+
+get_negative_cache / set_negative_cache: the process-wide NegativeCache (in memory unless you set one with a path)
+"""
+
+import json
+import os
+import threading
+import time
+from dataclasses import dataclass
+
+from .exceptions import KnownBadTrackError, TrackUnavailableError
+
+DEFAULT_TTL = 6 * 60 * 60
+
+
+@dataclass(slots=True, frozen=True)
+class Failure:
+    reason: str
+    message: str
+    time: float
+
+
+def _key(track_id: int) -> str:
+    return f"id:{track_id}"
+
+
+class NegativeCache:
+    """Known-bad tracks, keyed by track id. Bulk jobs only ever have ids (set/collection listings), so that's all
+    that's kept: a URL that fails to resolve isn't recorded.
+
+    Methods
+    ----
+    record: remember a failure for a track (record_error does it straight from an exception)
+    get: the unexpired Failure for a track, or None
+    check: raises KnownBadTrackError if the track has an unexpired failure
+    forget / clear: drop one entry / everything
+    """
+
+    def __init__(self, path: str | None = None, ttl: float = DEFAULT_TTL, ttls: dict[str, float] | None = None):
+        self.path = path
+        self.ttl = ttl
+        self.ttls = dict(ttls or {})
+        self._lock = threading.Lock()
+        self._entries: dict[str, Failure] = {}
+        if path is not None and os.path.exists(path):
+            with open(path, "r") as h:
+                entries = {k: Failure(**v) for k, v in json.load(h).items()}
+            # older files had url: keys nothing reads, and expired entries only get dropped when looked up
+            now = time.time()
+            self._entries = {k: f for k, f in entries.items() if k.startswith("id:") and not self._expired(f, now)}
+
+    def _save(self) -> None:
+        if self.path is None:
+            return
+        tmp = self.path + ".tmp"
+        with open(tmp, "w+") as h:
+            json.dump({k: {"reason": f.reason, "message": f.message, "time": f.time} for k, f in self._entries.items()}, h)
+        os.replace(tmp, self.path)
+
+    def _expired(self, failure: Failure, now: float) -> bool:
+        return now - failure.time > self.ttls.get(failure.reason, self.ttl)
+
+    def record(self, track_id: int, reason: str, message: str = "") -> None:
+        with self._lock:
+            self._entries[_key(track_id)] = Failure(reason, message, time.time())
+            self._save()
+
+    def record_error(self, error: TrackUnavailableError) -> None:
+        if error.cacheable and error.track_id is not None:
+            self.record(error.track_id, error.reason, str(error))
+
+    def get(self, track_id: int) -> Failure | None:
+        key = _key(track_id)
+        with self._lock:
+            failure = self._entries.get(key)
+            if failure is not None and self._expired(failure, time.time()):
+                del self._entries[key]
+                self._save()
+                return None
+            return failure
+
+    def check(self, track_id: int) -> None:
+        failure = self.get(track_id)
+        if failure is not None:
+            raise KnownBadTrackError(
+                "skipping {}, it failed recently ({}: {})".format(track_id, failure.reason, failure.message),
+                track_id=track_id,
+            )
+
+    def forget(self, track_id: int) -> None:
+        with self._lock:
+            if self._entries.pop(_key(track_id), None) is not None:
+                self._save()
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+            self._save()
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def __repr__(self) -> str:
+        return "NegativeCache({} tracks{})".format(len(self), ", " + self.path if self.path else "")
+
+
+_cache = NegativeCache()
+
+
+def get_negative_cache() -> NegativeCache:
+    return _cache
+
+
+def set_negative_cache(cache: NegativeCache) -> NegativeCache:
+    global _cache
+    _cache = cache
+    return _cache
@@ -0,0 +1,118 @@
+"""
+post-processing (tags + cover art)
+----
+mutagen parsing/tagging is CPU work holding the GIL, done inline it slows down the threads doing network I/O.
+apply_tags is the tagging itself and works on a path or a file object; stream_download calls it inline for single
+tracks. PostProcessor runs it in a process pool on finished files instead, so big set downloads can keep the network
+busy while tagging happens on other cores.
+
+    with PostProcessor() as post:
+        some_set.download_all("dls", postprocessor=post)
+"""
+
+import hashlib
+import logging
+import multiprocessing
+import os
+from concurrent.futures import Future, ProcessPoolExecutor
+from typing import IO
+
+import mutagen
+import requests
+from mutagen.id3 import APIC, ID3
+from mutagen.mp3 import MP3
+
+from .records import TrackRecord
+from .shared import fetch_artwork
+
+logger = logging.getLogger("raincloud")
+
+
+def _image_mime(data: bytes) -> str:
+    return "image/png" if data.startswith(b"\x89PNG") else "image/jpeg"
+
+
+def apply_tags(target: str | IO[bytes], title: str, artist: str, codec: str, cover: bytes | None = None) -> None:
+    """Sets title/artist, and cover art for mp3s (APIC is an ID3 frame). target is a path or a seekable file object.
+    Containers mutagen can't identify (e.g. raw TS from some HLS streams) are left untagged."""
+    # add title and artist
+    audio_ez = mutagen.File(target, easy=True)
+    if audio_ez is None:
+        logger.info("Can't tag %s (%s), mutagen doesn't recognise the container", title, codec)
+        if not isinstance(target, str):
+            target.seek(0)
+        return
+    if audio_ez.tags is None:
+        audio_ez.add_tags()
+    audio_ez["title"] = title
+    audio_ez["artist"] = artist
+    audio_ez.save(target)
+
+    # cover art https://stackoverflow.com/questions/38510694/how-to-add-album-art-to-mp3-file-using-python-3
+    if codec == "mp3" and cover:
+        if not isinstance(target, str):
+            target.seek(0)
+        audio = MP3(target, ID3=ID3)
+        audio.tags.add(
+            APIC(
+                encoding=3,  # utf-8
+                mime=_image_mime(cover),
+                type=3,  # means cover image
+                desc="Cover",
+                data=cover,
+            )
+        )
+        audio.save(target)
+
+    if not isinstance(target, str):
+        target.seek(0)
+
+
+def get_cover(record: TrackRecord) -> bytes | None:
+    # missing cover art should never fail a download
+    try:
+        return fetch_artwork(record.artwork_url)
+    except requests.exceptions.MissingSchema:
+        logger.info("No cover image found for %s", record.title)
+        return None
+    except requests.RequestException as e:
+        logger.warning("Couldn't fetch the cover for %s: %s", record.title, e)
+        return None
+
+
+def tag_file(path: str, title: str, artist: str, codec: str, cover: bytes | None = None) -> tuple[int, str]:
+    """apply_tags for a file on disk, returns its new (size, sha256). Runs in the worker processes."""
+    apply_tags(path, title, artist, codec, cover)
+    sha256 = hashlib.sha256()
+    with open(path, "rb") as h:
+        while chunk := h.read(1024 * 1024):
+            sha256.update(chunk)
+    return os.path.getsize(path), sha256.hexdigest()
+
+
+class PostProcessor:
+    """A process pool that tags finished files. submit() returns a Future of (size, sha256) of the tagged file.
+
+    Arguments
+    ----
+    workers: processes, defaults to the number of cores
+    """
+
+    def __init__(self, workers: int | None = None):
+        # never fork: the pool is often started from a busy multi-threaded process (the daemon), and forking that
+        # copies locks held by other threads. forkserver where there is one, spawn otherwise
+        method = "forkserver" if "forkserver" in multiprocessing.get_all_start_methods() else "spawn"
+        self.pool = ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context(method))
+
+    def submit(self, path: str, record: TrackRecord, codec: str) -> "Future[tuple[int, str]]":
+        # artwork is fetched here (cached, warm session), the worker only gets bytes
+        return self.pool.submit(tag_file, path, record.title, record.artist, codec, get_cover(record))
+
+    def shutdown(self, wait: bool = True) -> None:
+        self.pool.shutdown(wait=wait)
+
+    def __enter__(self) -> "PostProcessor":
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self.shutdown()
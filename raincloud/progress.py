@@ -0,0 +1,109 @@
+"""
+progress reporting for downloads
+----
+stream_download takes a `progress` callback, which gets a ProgressEvent. by default nothing is reported (no more
+printing to stdout when used as a library). calls are rate-limited by ProgressReporter so the download loop
+doesn't pay for a callback on every chunk.
+
+renderers:
+* TqdmProgress: a tqdm bar (tqdm is only imported when you use it)
+* log_progress: logs through the 'raincloud' logger
+
+anything else that takes a ProgressEvent works too, e.g. a Qt signal's emit or a streamlit progress bar.
+"""
+
+import logging
+import time
+from dataclasses import dataclass
+from typing import Callable
+
+logger = logging.getLogger("raincloud")
+
+
+@dataclass(slots=True, frozen=True)
+class ProgressEvent:
+    desc: str
+    done: int  # bytes so far
+    total: int | None  # bytes expected, None if unknown
+    elapsed: float  # seconds since start
+    finished: bool = False
+
+    @property
+    def rate(self) -> float:
+        """bytes per second"""
+        return self.done / self.elapsed if self.elapsed > 0 else 0.0
+
+    @property
+    def fraction(self) -> float | None:
+        if not self.total:
+            return None
+        return min(self.done / self.total, 1.0)
+
+
+ProgressCallback = Callable[[ProgressEvent], None]
+
+
+class ProgressReporter:
+    """Counts bytes and calls the callback at most every min_interval seconds (and once at the end).
+    update() is just an add and a clock read when it's not time to report yet."""
+
+    def __init__(
+        self,
+        callback: ProgressCallback | None,
+        total: int | None = None,
+        desc: str = "",
+        min_interval: float = 0.25,
+    ):
+        self.callback = callback
+        self.total = total
+        self.desc = desc
+        self.min_interval = min_interval
+        self.done = 0
+        self.start = time.monotonic()
+        self._next = self.start
+
+    def _emit(self, now: float, finished: bool = False) -> None:
+        self.callback(ProgressEvent(self.desc, self.done, self.total, now - self.start, finished))
+
+    def update(self, n: int) -> None:
+        self.done += n
+        if self.callback is None:
+            return
+        now = time.monotonic()
+        if now >= self._next:
+            self._next = now + self.min_interval
+            self._emit(now)
+
+    def close(self) -> None:
+        if self.callback is not None:
+            self._emit(time.monotonic(), finished=True)
+
+
+class TqdmProgress:
+    """A tqdm bar as a progress callback. One bar at a time, a new one starts when desc changes or the last finished."""
+
+    def __init__(self, **tqdm_kwargs):
+        from tqdm import tqdm  # optional, only needed if you want bars
+
+        self._tqdm = tqdm
+        self.kwargs = {"unit": "B", "unit_scale": True, "unit_divisor": 1024, **tqdm_kwargs}
+        self.bar = None
+
+    def __call__(self, event: ProgressEvent) -> None:
+        if self.bar is None or self.bar.desc != event.desc:
+            if self.bar is not None:
+                self.bar.close()
+            self.bar = self._tqdm(total=event.total, desc=event.desc, **self.kwargs)
+        self.bar.update(event.done - self.bar.n)
+        if event.finished:
+            self.bar.close()
+            self.bar = None
+
+
+def log_progress(event: ProgressEvent) -> None:
+    if event.finished:
+        logger.info("%s: done, %.2f MB at %.2f MB/s", event.desc, event.done / 1e6, event.rate / 1e6)
+    elif event.fraction is not None:
+        logger.info("%s: %d%% (%.2f MB/s)", event.desc, event.fraction * 100, event.rate / 1e6)
+    else:
+        logger.info("%s: %.2f MB (%.2f MB/s)", event.desc, event.done / 1e6, event.rate / 1e6)
@@ -1,30 +1,59 @@
 """
 raincloud v2 api, contains SCTrack and SCSet classes with:
 * resolve_url, which has loads of important metadata most importantly streaming url
-* SCSet has tracks attribute which is a list of SCTracks
+* SCSet has tracks attribute which is a list of SCTracks, iter_tracks for a lazy version
+* likes, uploads and reposts are paginated collections, see collection.py
 * SCTrack has stream_url attribute, with methods stream_download
+* SCTrack picks its transcoding with a policy, see transcoding.py
+* tracks keep a compact TrackRecord instead of the whole resolved JSON, see records.py
+* HLS playlists are parsed into segments with durations and coalesced byte ranges, see hls.py
+* unavailable tracks raise TrackUnavailableError subclasses and get remembered so they're skipped, see negcache.py
  ／l、
 （ﾟ､ ｡ ７
   l  ~ヽ
   じしf_,)ノ
 """
 
-import requests
-import re
-from mutagen.id3 import APIC, ID3
-import mutagen
-from mutagen.mp3 import MP3
-from tqdm import tqdm
-from io import BytesIO
+import logging
+import os
+import threading
+from contextlib import contextmanager
+from typing import Iterator
+from concurrent.futures import ThreadPoolExecutor
 
-from .exceptions import SCClientIDError, TrackSetMismatchError
-from .shared import DownloadedTrack
+import requests
+import urllib3
+
+from .exceptions import (
+    SCClientIDError,
+    TrackSetMismatchError,
+    TrackUnavailableError,
+    TrackNotFoundError,
+    TrackBlockedError,
+    NoTranscodingError,
+    EncryptedStreamError,
+    DownloadFailedError,
+)
+from .shared import DownloadedTrack, prefetched, session
+from .postprocess import PostProcessor, apply_tags, get_cover
+from .buffers import DownloadBuffer
+from .transcoding import Transcoding, select_transcoding, estimate_bytes, PROGRESSIVE_FIRST
+from .hls import HLSPlaylist
+from .records import TrackRecord
+from .library import Library
+from .progress import ProgressCallback, ProgressReporter
+from .transfer import copy_response, segmented_download, AdaptiveChunker
+from .scheduler import DownloadScheduler, Ticket, get_scheduler, INTERACTIVE, BULK
+from .negcache import get_negative_cache
+
+logger = logging.getLogger("raincloud")
 
 class SCBase:
     """The base class for SC tracks, playlists. Attribute is resolved url, arguments client ID and URL. There's like no reason for a user to import this tbh it's only for inheritance"""
 
-    def __init__(self, client_id: str, sc_url: str):
+    def __init__(self, client_id: str, sc_url: str, keep_raw: bool = False):
         self.client_id = client_id
+        self.keep_raw = keep_raw  # hold on to the full resolved JSON instead of just the compact record
 
         self.params = {
             "client_id": client_id,
@@ -43,18 +72,59 @@ class SCBase:
     def resolved(self) -> dict:
         # the resolved url, contains a whole bunch of metadata, most importantly the streaming URL for the track
         if self._resolved is None:
-            response = requests.get(
+            response = session.get(
                 f"{self.api_url}/resolve",
                 params=self.params,
                 headers=self.default_headers,
             )
             if response.status_code == 401:
                 raise SCClientIDError("Invalid client_id: {}".format(self.client_id))
+            if response.status_code == 404:
+                raise TrackNotFoundError("{} not found (removed, private or a typo)".format(self.params["url"]), url=self.params["url"])
+            if response.status_code == 403:
+                raise TrackBlockedError("{} is not available here".format(self.params["url"]), url=self.params["url"])
             response.raise_for_status()
             self._resolved = response.json()
 
         return self._resolved
 
+    def fetch_records(self, ids: list[int]) -> dict[int, TrackRecord]:
+        # the /tracks endpoint takes up to 50 ids at once, way better than one request per track
+        fetched = {}
+        for i in range(0, len(ids), 50):
+            response = session.get(
+                f"{self.api_url}/tracks",
+                params={"client_id": self.client_id, "ids": ",".join(str(id) for id in ids[i:i + 50])},
+                headers=self.default_headers,
+            )
+            response.raise_for_status()
+            for t in response.json():
+                fetched[t["id"]] = TrackRecord.from_resolved(t, self.keep_raw)
+        return fetched
+
+    def complete_records(self, stubs: list[dict]) -> list[TrackRecord]:
+        """Records for a list of track JSONs, some of which might only be {'id': ...}. Keeps the order,
+        tracks SC doesn't return (removed, blocked) are left out and go in the negative cache, tracks
+        already in there are left out without being requested."""
+        cache = get_negative_cache()
+        total = len(stubs)
+        stubs = [t for t in stubs if cache.get(t["id"]) is None]
+        full = {t["id"]: TrackRecord.from_resolved(t, self.keep_raw) for t in stubs if "media" in t}
+        full.update(self.fetch_records([t["id"] for t in stubs if t["id"] not in full]))
+        records = []
+        for t in stubs:
+            record = full.get(t["id"])
+            if record is None:
+                cache.record(t["id"], TrackNotFoundError.reason, "not returned by /tracks")
+            elif record.policy == "BLOCK":
+                cache.record(record.id, TrackBlockedError.reason, "{} is blocked here".format(record.permalink))
+            else:
+                records.append(record)
+        skipped = total - len(records)
+        if skipped:
+            logger.info("skipping %d unavailable track(s)", skipped)
+        return records
+
     @property
     def title(self) -> str:
         return self.resolved["title"]
@@ -75,137 +145,250 @@ class SCTrack(SCBase):
     ----
     client_id: a valid soundcloud client ID
     sc_url: the track URL
+    transcoding_policy: how to pick the stream, "progressive" (default), "smallest", "best", or a codec ("mp3", "opus", "aac")
+    keep_raw: keep the full resolved JSON around, by default only the compact record is kept
 
     Methods
     ----
-    stream_download: returns downloaded file as bytes.
+    stream_download: returns downloaded file as bytes. start/end (seconds) download part of an HLS stream,
+        progress is an optional callback getting ProgressEvents (see progress.py), nothing is printed without one.
+        priority/job place it in the shared DownloadScheduler (INTERACTIVE by default, SCSet.download_all uses BULK).
+        connections > 1 splits a progressive download into that many parallel byte ranges (good for long mixes),
+        as far as the scheduler has slots free for them.
+    from_record: build an SCTrack straight from a TrackRecord, no /resolve request
 
     Attributes
     ----
     client_id: the soundcloud client ID used to instantiate
-    resolved: JSON data for the SC track. Contains important metadata such as title, artist, streaming
+    record: compact TrackRecord with id, permalink, title, artist, artwork, duration, transcodings
+    resolved: JSON data for the SC track. Fetched again if keep_raw is off and it was already dropped
+    transcodings: every available Transcoding for the track
+    transcoding: the Transcoding picked by transcoding_policy
+    estimated_size: estimated bytes for the picked transcoding, from duration and bitrate
     stream_url: the URL for streaming -- can be an MP3
     progressive_streaming: true if progressive streaming is present, if HLS then false
+    playlist: the parsed HLSPlaylist (segments, durations) for an HLS transcoding
 
     """
 
-    def __init__(self, client_id: str, sc_url: str):
-        super().__init__(client_id, sc_url)
+    def __init__(
+        self,
+        client_id: str,
+        sc_url: str,
+        transcoding_policy: str = PROGRESSIVE_FIRST,
+        keep_raw: bool = False,
+    ):
+        super().__init__(client_id, sc_url, keep_raw)
+        self.transcoding_policy = transcoding_policy
+        self._record: TrackRecord | None = None
 
         if "/sets/" in sc_url and "in=" not in sc_url:
             raise TrackSetMismatchError(
                 "URL provided is detected as a set. Please use SCSet instead."
             )
 
+    @classmethod
+    def from_record(
+        cls, client_id: str, record: TrackRecord, transcoding_policy: str = PROGRESSIVE_FIRST
+    ) -> "SCTrack":
+        track = cls(client_id, record.permalink, transcoding_policy, keep_raw=record.raw is not None)
+        track._record = record
+        track._resolved = record.raw
+        return track
+
+    @contextmanager
+    def _failures(self):
+        """Records TrackUnavailableErrors on their way out, so bulk jobs skip this track next time.
+        Only verdicts about the track itself are kept, see TrackUnavailableError.cacheable."""
+        try:
+            yield
+        except TrackUnavailableError as e:
+            get_negative_cache().record_error(e)
+            raise
+
+    @contextmanager
+    def _network_errors(self):
+        # dropped connections, timeouts, 5xx/429 -> DownloadFailedError. not cached, they say nothing about the track
+        try:
+            yield
+        except DownloadFailedError as e:
+            if e.track_id is None:
+                e.track_id = self.record.id
+            raise
+        except (requests.RequestException, urllib3.exceptions.HTTPError) as e:
+            raise DownloadFailedError("download of {} failed: {}".format(self.title, e), track_id=self.record.id) from e
+
     @property
-    def stream_url(self) -> str:
-        assert self.resolved["kind"] == "track"
-
-        # progressive check should be up there
-        # new function to get this url, return prog url if possible, else return mp3
-        has_prog = False
-        for tr in self.resolved["media"]["transcodings"]:
-            if tr["format"]["protocol"] == "progressive":
-                prog_url = tr["url"]
-                has_prog = True
-        if has_prog == False:
-            for tr in self.resolved["media"]["transcodings"]:
-                if "mp3" in tr["preset"]:
-                    hls_url = tr["url"]
-                if not hls_url:
-                    print("No MP3 URL found, download is cooked sadly")
-
-        if has_prog:
-            result = requests.get(
-                prog_url,
-                params={"client_id": self.client_id},
-                headers=self.default_headers,
+    def record(self) -> TrackRecord:
+        if self._record is None:
+            with self._failures():
+                self._record = TrackRecord.from_resolved(self.resolved, self.keep_raw)
+            if not self.keep_raw:
+                self._resolved = None  # the record has everything we use, drop the big JSON
+        return self._record
+
+    @property
+    def title(self) -> str:
+        return self.record.title
+
+    @property
+    def artist(self) -> str:
+        return self.record.artist
+
+    @property
+    def artwork_url(self) -> str:
+        return self.record.artwork_url
+
+    @property
+    def transcodings(self) -> list[Transcoding]:
+        return list(self.record.transcodings)
+
+    @property
+    def transcoding(self) -> Transcoding:
+        if self.record.policy == "BLOCK":
+            raise TrackBlockedError("{} is blocked here".format(self.title), track_id=self.record.id)
+        if not any(tr.supported for tr in self.transcodings):
+            # nothing at all, or only encrypted (DRM) streams we'd download as ciphertext
+            raise NoTranscodingError(
+                "{} has no downloadable transcodings ({})".format(
+                    self.title, ", ".join(sorted({tr.protocol for tr in self.transcodings})) or "none"
+                ),
+                track_id=self.record.id,
+            )
+        tr = select_transcoding(self.transcodings, self.transcoding_policy)
+        if tr is None:
+            # no track_id: this is about the policy, not the track, so it stays out of the negative cache
+            raise NoTranscodingError(
+                "No transcoding matching policy '{}' for {}".format(self.transcoding_policy, self.title)
             )
-            stream_url = result.json()["url"]
-        else:
-            result = requests.get(
-                hls_url,
+        return tr
+
+    @property
+    def estimated_size(self) -> int:
+        return self.transcoding.estimated_bytes
+
+    @property
+    def stream_url(self) -> str:
+        with self._failures():
+            result = session.get(
+                self.transcoding.url,
                 params={"client_id": self.client_id},
                 headers=self.default_headers,
             )
-            stream_url = result.json()["url"]
-        return stream_url
+            if result.status_code == 401:
+                raise SCClientIDError("Invalid client_id: {}".format(self.client_id))
+            if result.status_code == 404:
+                raise TrackNotFoundError("no stream for {}".format(self.title), track_id=self.record.id)
+            if result.status_code == 403:
+                raise TrackBlockedError("{} can't be streamed here".format(self.title), track_id=self.record.id)
+            result.raise_for_status()
+            return result.json()["url"]
 
     @property
     def progressive_streaming(self) -> bool:
-        return not "playlist" in self.stream_url  # 'playlist' in M3U stream URLs
+        return self.transcoding.progressive
 
-    def stream_download(self, metadata: bool = True) -> "DownloadedTrack":
-        buffer: BytesIO = BytesIO()
-        response = requests.get(self.stream_url, stream=True)
+    @property
+    def playlist(self) -> HLSPlaylist:
         if self.progressive_streaming:
-            total_size = int(response.headers.get("content-length", 0))
-            if response.status_code == 200:  # if it works...
-                # cooler progress bar
-                for chunk in tqdm(
-                    response.iter_content(chunk_size=8192),
-                    total=total_size // 8192,
-                    unit="chunk",
-                    unit_scale=True,
-                    desc="Downloading Progressive",
-                ):
-                    if chunk:
-                        buffer.write(chunk)
-                print(
-                    f"downloaded, size: {round(len(buffer.getvalue()) / (1024*1024), 2)} MB."
-                )
-
-        else:
-            print("HLS streaming, warning SLOW download")
-            m3u_playlist = response.content.decode("utf-8")  # m3u8 file to string
-            m3u_urls = re.findall(
-                re.compile(r"http.*"), m3u_playlist
-            )  # get the streaming links as a list
-
-            # TODO: parallel processing possible?
-            # download sequentially from m3u url, TQDM used for progress bar
-            for i, url in enumerate(
-                tqdm(m3u_urls, desc="Downloading HLS", unit="chunk")
-            ):
-                response = requests.get(url, stream=True)
-                for chunk in response.iter_content(chunk_size=8192):
-                    buffer.write(chunk)
+            raise ValueError("{} uses a progressive transcoding, there's no playlist".format(self.title))
+        stream_url = self.stream_url
+        response = session.get(stream_url, headers=self.default_headers)
+        response.raise_for_status()
+        try:
+            return HLSPlaylist.parse(response.text, stream_url)
+        except EncryptedStreamError as e:
+            e.track_id = self.record.id  # it's the track's stream, so it's a verdict about the track
+            raise
+
+    def stream_download(
+        self,
+        metadata: bool = True,
+        start: float | None = None,
+        end: float | None = None,
+        progress: ProgressCallback | None = None,
+        priority: int = INTERACTIVE,
+        job: str | None = None,
+        scheduler: DownloadScheduler | None = None,
+        connections: int = 1,
+    ) -> "DownloadedTrack":
+        # in bulk jobs known-bad tracks fail right away, before taking a scheduler slot or any memory.
+        # interactive downloads always try, the user asked for this track specifically
+        if priority > INTERACTIVE:
+            get_negative_cache().check(self.record.id)
+        with self._failures():
+            transcoding = self.transcoding
+        # connection slot from the shared scheduler, interactive downloads go ahead of bulk ones (see scheduler.py).
+        # taken before the buffer, so bulk downloads waiting for a slot don't sit on memory an interactive one needs
+        scheduler = scheduler or get_scheduler()
+        with scheduler.slot(priority, job or self.record.permalink) as ticket:
+            # counted against the global memory budget, spills to a temp file for long tracks (see buffers.py)
+            buffer: DownloadBuffer = DownloadBuffer()
+            try:
+                self._fetch(buffer, transcoding, start, end, progress, ticket, connections)
+            except BaseException:
+                buffer.close()  # gives the reservation back
+                raise
 
         # reset buffer position to start
         buffer.seek(0)
 
-        # add metadata
+        # add metadata, inline here. SCSet.download_all can hand this to a PostProcessor instead
         if metadata:
+            apply_tags(buffer, self.title, self.artist, transcoding.codec, get_cover(self.record))
 
-            # add title and artist
-            audio_ez = mutagen.File(buffer, easy=True)
-
-            if audio_ez.tags is None:
-                audio_ez.add_tags()
-            audio_ez["title"] = self.title
-            audio_ez["artist"] = self.artist
-            audio_ez.save(buffer)
-            buffer.seek(0)
-            # Try to add cover art https://stackoverflow.com/questions/38510694/how-to-add-album-art-to-mp3-file-using-python-3
-            try:
-                cover_img = requests.get(self.artwork_url).content
-                audio = MP3(buffer, ID3=ID3)
-                audio.tags.add(
-                    APIC(
-                        encoding=3,  # utf-8
-                        mime="image/png",
-                        type=3,  # means cover image
-                        desc="Cover",
-                        data=cover_img,
-                    )
-                )
-
-            except requests.exceptions.MissingSchema:
-                cover_img = None
-                print("No cover image found")
-            
         buffer.seek(0)
-        return DownloadedTrack.from_bytesio(buffer, f"{self.resolved['permalink_url'].split('/')[-1]}.mp3") # switching to this instead of title in case of identical titles (this can be identical too but rare)
+        buffer.trim()  # done writing, only hold on to what the track actually takes
+        return DownloadedTrack.from_bytesio(buffer, f"{self.record.slug}.{transcoding.extension}", self.record) # switching to this instead of title in case of identical titles (this can be identical too but rare)
+
+    def _fetch(
+        self,
+        buffer: DownloadBuffer,
+        transcoding: Transcoding,
+        start: float | None,
+        end: float | None,
+        progress: ProgressCallback | None,
+        ticket: Ticket,
+        connections: int,
+    ) -> None:
+        with self._failures(), self._network_errors():
+            if transcoding.progressive:
+                if start is not None or end is not None:
+                    raise ValueError("time ranges need an HLS transcoding, try transcoding_policy='smallest'")
+                if connections > 1:
+                    # parallel byte ranges, falls back to one stream if the CDN doesn't do ranges.
+                    # every connection holds a scheduler slot, so it only gets as many as are free
+                    with ticket.scheduler.extra(ticket, connections - 1) as extra:
+                        reporter = ProgressReporter(progress, None, f"{self.title} (progressive x{1 + extra})")
+                        segmented_download(self.stream_url, buffer, 1 + extra, reporter, ticket.pace, session)
+                else:
+                    response = session.get(self.stream_url, stream=True)
+                    response.raise_for_status()
+                    total_size = int(response.headers.get("content-length", 0)) or None
+                    reporter = ProgressReporter(progress, total_size, f"{self.title} (progressive)")
+                    copy_response(response, buffer, reporter, pace=ticket.pace)
+                reporter.close()
+                logger.info("downloaded %s, size: %s MB", self.title, round(buffer.nbytes / (1024*1024), 2))
+
+            else:
+                logger.info("%s is HLS streaming, can be slow", self.title)
+                playlist = self.playlist.slice(start, end)
+                requests_needed = playlist.requests()
+
+                # exact size if everything is byte ranges, otherwise guess from the bitrate
+                if all(req.start is not None for req in requests_needed):
+                    total_size = sum(req.end - req.start + 1 for req in requests_needed)
+                else:
+                    total_size = estimate_bytes(int(playlist.total_duration * 1000), transcoding.bitrate)
+                reporter = ProgressReporter(progress, total_size, f"{self.title} (HLS)")
+                chunker = AdaptiveChunker()  # shared across segments so it doesn't restart small every request
+
+                # adjacent byte ranges are merged so this is usually way fewer requests than segments
+                for req in requests_needed:
+                    response = session.get(req.uri, headers=req.headers, stream=True)
+                    response.raise_for_status()
+                    copy_response(response, buffer, reporter, chunker, ticket.pace)
+                reporter.close()
 
     def __repr__(self) -> str:
         return "SCTrack('{} - {}')".format(self.artist, self.title)
@@ -217,38 +400,146 @@ class SCSet(SCBase):
     ----
     client_id: a valid soundcloud client ID
     sc_url: the set URL
+    transcoding_policy: passed to every SCTrack, see SCTrack
+    keep_raw: keep the full JSON for the set and its tracks, by default only compact records are kept
 
     Attributes
     ----
+    records: a list of TrackRecord for each track in the set (fetched in batches, no per-track /resolve)
     tracks: a list of SCTrack objects corresponding to each track in the set.
+    iter_records / iter_tracks: lazy generator versions of the above, also what iterating the set does
+
+    Methods
+    ----
+    download_all: downloads every track to a directory, skipping ones a Library already has
+    estimated_size: estimated total bytes of all tracks with the chosen transcoding_policy
     Other SC Base attributes (client_id, artist, title, resolved)
     """
 
-    def __init__(self, client_id: str, sc_url: str):
-        super().__init__(client_id, sc_url)
+    def __init__(
+        self,
+        client_id: str,
+        sc_url: str,
+        transcoding_policy: str = PROGRESSIVE_FIRST,
+        keep_raw: bool = False,
+    ):
+        super().__init__(client_id, sc_url, keep_raw)
+        self.transcoding_policy = transcoding_policy
+        self._records: list[TrackRecord] | None = None
+        self._records_lock = threading.RLock()  # the daemon shares one SCSet between job threads
         if "/sets/" not in sc_url or "in=" in sc_url:
             raise TrackSetMismatchError(
                 "URL is likely a track. Please use SCTrack instead."
             )
 
+    def iter_records(self) -> Iterator[TrackRecord]:
+        """Lazy version of records. id-only entries are fetched 50 at a time, with the next batch
+        already being fetched while the current one is used, so big sets can start downloading right away."""
+        with self._records_lock:
+            # read once: records may drop resolved["tracks"] from another thread right after
+            records = self._records
+            stubs = self.resolved["tracks"] if records is None else None
+        if records is not None:
+            yield from records
+            return
+        # sets only come with full data for the first few tracks, the rest are just ids
+        batches = [stubs[i:i + 50] for i in range(0, len(stubs), 50)]
+        for batch in prefetched(self.complete_records, batches):
+            yield from batch
+
+    def iter_tracks(self) -> Iterator[SCTrack]:
+        for r in self.iter_records():
+            yield SCTrack.from_record(self.client_id, r, self.transcoding_policy)
+
+    @property
+    def records(self) -> list[TrackRecord]:
+        with self._records_lock:
+            if self._records is None:
+                self._records = list(self.iter_records())
+                if not self.keep_raw:
+                    self._resolved.pop("tracks", None)
+            return self._records
+
     @property
     def tracks(self) -> list[SCTrack]:
-        track_urls = []
-        for t in self.resolved["tracks"]:
+        return [SCTrack.from_record(self.client_id, r, self.transcoding_policy) for r in self.records]
+
+    def __iter__(self) -> Iterator[SCTrack]:
+        return self.iter_tracks()
+
+    def download_all(
+        self,
+        dir: str = os.getcwd(),
+        metadata: bool = True,
+        library: Library | None = None,
+        progress: ProgressCallback | None = None,
+        workers: int = 1,
+        priority: int = BULK,
+        postprocessor: PostProcessor | None = None,
+    ) -> list[str]:
+        """Downloads every track into dir, returns the paths written. With a library, tracks it already
+        has are skipped (just marked as part of this set) and new ones get indexed.
+        workers > 1 downloads several tracks at once, they all count as one job in the scheduler so
+        other jobs still get their fair share of slots.
+        With a postprocessor, tagging happens in its process pool instead of on the download threads,
+        everything is tagged by the time this returns.
+        Tracks that are unavailable (or already known to be, see negcache.py) are logged and skipped."""
+        permalink = self.resolved["permalink_url"]
+        tagging = []
+
+        def download(track: SCTrack) -> str | None:
+            inline = metadata and postprocessor is None
+            try:
+                dt = track.stream_download(inline, progress=progress, priority=priority, job=permalink)
+            except TrackUnavailableError as e:
+                logger.warning("skipping %s (%s): %s", track.record.permalink, e.reason, e)
+                return None
+            try:
+                path = dt.write_to_file(dir, library, self.title, permalink)
+            finally:
+                dt.close()
+            if metadata and postprocessor is not None:
+                future = postprocessor.submit(path, track.record, track.transcoding.codec)
+                if library is not None:
+                    # re-index once tagged so size/hash match what's on disk (untouched if tagging failed)
+                    future.add_done_callback(
+                        lambda f, r=track.record: f.exception() is None
+                        and library.add(r, path, *f.result(), self.title, permalink)
+                    )
+                tagging.append((future, path))
+            return path
+
+        paths = []
+        with ThreadPoolExecutor(max_workers=workers) as pool:
+            in_flight = []
+            for track in self.iter_tracks():
+                if library is not None and library.has(track.record.id):
+                    library.add_to_set(track.record.id, self.title, permalink)
+                    continue
+                in_flight.append(pool.submit(download, track))
+                # don't run ahead of the downloads, keeps the set listing lazy
+                if len(in_flight) >= workers * 2:
+                    paths.append(in_flight.pop(0).result())
+            paths.extend(f.result() for f in in_flight)
+        for future, path in tagging:
+            # the file is there either way, a tagging failure shouldn't throw away the whole set's result
+            try:
+                future.result()
+            except Exception as e:
+                logger.warning("couldn't tag %s: %s", path, e)
+        return [p for p in paths if p is not None]
+
+    @property
+    def estimated_size(self) -> int:
+        # total estimated bytes for the whole set, handy for planning bandwidth before a big download.
+        # tracks that can't be downloaded (e.g. no transcoding for the policy) count as 0, download_all skips them too
+        total = 0
+        for t in self.tracks:
             try:
-                track_urls.append(t["permalink_url"])
-            except KeyError:
-                track_urls.append(
-                    requests.get(
-                        f"https://api-v2.soundcloud.com/tracks/{t['id']}",
-                        params={"client_id": self.client_id},
-                        headers=self.default_headers,
-                    ).json()["permalink_url"]
-                )
-        l = []
-        for url in track_urls:
-            l.append(SCTrack(self.client_id, url))
-        return l
+                total += t.estimated_size
+            except TrackUnavailableError:
+                continue
+        return total
 
     def __repr__(self) -> str:
-        return "SCSet({} Tracks)".format(len(self.tracks))
+        return "SCSet({} Tracks)".format(len(self.records))
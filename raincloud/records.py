@@ -0,0 +1,73 @@
+"""
+compact track records
+----
+the /resolve JSON for a track is big (user object, waveform, every transcoding, visuals...) and we only use a dozen
+fields of it. TrackRecord keeps just those in __slots__, the raw JSON is only kept if asked for (keep_raw=True).
+SCTrack and SCSet build these and work off them, see SCTrack.from_record.
+"""
+
+from .exceptions import TrackSetMismatchError
+from .transcoding import Transcoding
+
+
+class TrackRecord:
+    """The bits of a resolved track we actually use.
+
+    Attributes
+    ----
+    id: SC track id
+    permalink: the track's permalink URL
+    title, artist, artwork_url: metadata (artwork_url can be None)
+    duration: in ms
+    transcodings: tuple of Transcoding
+    raw: the full JSON, None unless built with keep_raw=True
+    policy: SC's streaming policy ("ALLOW", "MONETIZE", "SNIP", "BLOCK"), BLOCK means not streamable from here
+    """
+
+    __slots__ = ("id", "permalink", "title", "artist", "artwork_url", "duration", "transcodings", "raw", "policy")
+
+    def __init__(
+        self,
+        id: int,
+        permalink: str,
+        title: str,
+        artist: str,
+        artwork_url: str | None,
+        duration: int,
+        transcodings: tuple[Transcoding, ...],
+        raw: dict | None = None,
+        policy: str = "ALLOW",
+    ):
+        self.id = id
+        self.permalink = permalink
+        self.title = title
+        self.artist = artist
+        self.artwork_url = artwork_url
+        self.duration = duration
+        self.transcodings = transcodings
+        self.raw = raw
+        self.policy = policy
+
+    @classmethod
+    def from_resolved(cls, data: dict, keep_raw: bool = False) -> "TrackRecord":
+        if data.get("kind", "track") != "track":
+            raise TrackSetMismatchError("Resolved {} is a {}, not a track".format(data.get("permalink_url"), data["kind"]))
+        return cls(
+            id=data["id"],
+            permalink=data["permalink_url"],
+            title=data["title"],
+            artist=data["user"]["username"],
+            artwork_url=data.get("artwork_url"),
+            duration=data.get("full_duration") or data.get("duration") or 0,
+            transcodings=tuple(Transcoding.from_json(tr) for tr in data.get("media", {}).get("transcodings", [])),
+            raw=data if keep_raw else None,
+            policy=data.get("policy") or "ALLOW",
+        )
+
+    @property
+    def slug(self) -> str:
+        # last bit of the permalink, used for filenames
+        return self.permalink.rstrip("/").split("/")[-1]
+
+    def __repr__(self) -> str:
+        return "TrackRecord({}, '{} - {}')".format(self.id, self.artist, self.title)
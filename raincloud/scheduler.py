@@ -0,0 +1,151 @@
+"""
+download scheduler shared by everything in the process
+----
+connection slots are handed out by priority, so a single-track request (INTERACTIVE) doesn't wait behind a 500-track set
+(BULK), and `reserved` slots are kept free for INTERACTIVE work only. within a priority, the job holding the fewest
+slots goes first, so two bulk jobs share evenly. waiting time slowly raises a waiter's priority (aging) so bulk work
+never starves.
+
+bandwidth: while a higher priority download is running, lower priority ones pace themselves down to `bulk_share` of
+their speed (they sleep between reads, see Ticket.pace), so they keep progressing without competing for the link.
+
+    with get_scheduler().slot(BULK, job="some set") as ticket:
+        copy_response(response, buffer, pace=ticket.pace)
+
+a download split over parallel connections holds one slot per connection, the extra ones come from extra()
+and are capped by what's free, so it can't crowd out other jobs or the reserved interactive slots.
+
+get_scheduler / set_scheduler: the process-wide DownloadScheduler
+"""
+
+import itertools
+import threading
+import time
+from contextlib import contextmanager
+from typing import Iterator
+
+INTERACTIVE = 0
+BULK = 10
+
+
+class Ticket:
+    """A held connection slot. pace() goes in the read loop."""
+
+    def __init__(self, scheduler: "DownloadScheduler", priority: int, job: str | None):
+        self.scheduler = scheduler
+        self.priority = priority
+        self.job = job
+
+    def pace(self, nbytes: int, seconds: float) -> None:
+        self.scheduler.pace(self.priority, seconds)
+
+
+class DownloadScheduler:
+    """Hands out `slots` connection slots by priority with fair sharing between jobs.
+
+    Arguments
+    ----
+    slots: max concurrent downloads
+    reserved: slots only INTERACTIVE downloads can use, so they never wait for a bulk track to finish
+    bulk_share: fraction of its normal speed a download keeps while something more important is running
+    aging: seconds of waiting that count as one priority level
+    """
+
+    def __init__(self, slots: int = 4, reserved: int = 1, bulk_share: float = 0.2, aging: float = 30.0):
+        self.slots = slots
+        self.reserved = min(reserved, slots - 1)
+        self.bulk_share = bulk_share
+        self.aging = aging
+        self._cond = threading.Condition()
+        self._seq = itertools.count()
+        self._waiting: dict[int, tuple[int, str | None, float]] = {}  # seq -> (priority, job, since)
+        self._active: list[Ticket] = []
+
+    def _job_slots(self, job: str | None) -> int:
+        return sum(1 for t in self._active if t.job == job)
+
+    def _limit(self, priority: int) -> int:
+        return self.slots if priority <= INTERACTIVE else self.slots - self.reserved
+
+    def _can_start(self, seq: int) -> bool:
+        # the best waiter out of those that could take a free slot right now. aging counts in whole levels,
+        # so within a level the job holding the fewest slots wins and only then the longest wait (seq)
+        now = time.monotonic()
+        eligible = [
+            (priority - int((now - since) // self.aging), self._job_slots(job), s)
+            for s, (priority, job, since) in self._waiting.items()
+            if len(self._active) < self._limit(priority)
+        ]
+        return bool(eligible) and min(eligible)[2] == seq
+
+    @contextmanager
+    def slot(self, priority: int = INTERACTIVE, job: str | None = None) -> Iterator[Ticket]:
+        ticket = Ticket(self, priority, job)
+        with self._cond:
+            seq = next(self._seq)
+            self._waiting[seq] = (priority, job, time.monotonic())
+            try:
+                # timeout so aging gets re-evaluated even if nobody notifies
+                while not self._can_start(seq):
+                    self._cond.wait(1.0)
+            finally:
+                del self._waiting[seq]
+            self._active.append(ticket)
+            self._cond.notify_all()
+        try:
+            yield ticket
+        finally:
+            with self._cond:
+                self._active.remove(ticket)
+                self._cond.notify_all()
+
+    @contextmanager
+    def extra(self, ticket: Ticket, n: int) -> Iterator[int]:
+        """Up to n more slots for whoever holds ticket, for splitting one download over several connections.
+        Never waits: only takes slots that are free, not reserved, and that nobody is queued for.
+        Yields how many it got."""
+        extra = []
+        with self._cond:
+            free = 0 if self._waiting else self.slots - self.reserved - len(self._active)
+            for _ in range(max(0, min(n, free))):
+                extra.append(Ticket(self, ticket.priority, ticket.job))
+            self._active.extend(extra)
+        try:
+            yield len(extra)
+        finally:
+            with self._cond:
+                for t in extra:
+                    self._active.remove(t)
+                self._cond.notify_all()
+
+    def preempted(self, priority: int) -> bool:
+        """True if a more important download is running or waiting."""
+        with self._cond:
+            return any(t.priority < priority for t in self._active) or any(
+                p < priority for p, _, _ in self._waiting.values()
+            )
+
+    def pace(self, priority: int, seconds: float) -> None:
+        # a read that took `seconds` is followed by a sleep that brings this download down to bulk_share of its speed
+        if self.bulk_share < 1 and self.preempted(priority):
+            time.sleep(seconds * (1 - self.bulk_share) / self.bulk_share)
+
+    @property
+    def active(self) -> int:
+        return len(self._active)
+
+    def __repr__(self) -> str:
+        return "DownloadScheduler({}/{} slots, {} waiting)".format(len(self._active), self.slots, len(self._waiting))
+
+
+_scheduler = DownloadScheduler()
+
+
+def get_scheduler() -> DownloadScheduler:
+    return _scheduler
+
+
+def set_scheduler(scheduler: DownloadScheduler) -> DownloadScheduler:
+    global _scheduler
+    _scheduler = scheduler
+    return _scheduler
@@ -1,9 +1,19 @@
 """
 Some shared stuff
 ----
+session: one requests.Session for the whole package, so connections stay warm between requests
+
 scrape_client_id: uses BeautifulSoup to extract a valid SC client_id from any SC url, using js
 
-DownloadedTrack: a dataclass for storing bytes with filename, size, and a method 'write_to_file' to write bytes to disk easily.
+load_client_id: reads client_id.txt, checks it still works and scrapes a new one if not
+
+fetch_artwork: downloads cover art, cached so a set by one artist doesn't fetch the same image 50 times
+
+stream_url_expiry: when a signed stream URL stops working (epoch seconds), from its CloudFront policy
+
+prefetched: generator that runs the next fetch in the background while the current result is being used
+
+DownloadedTrack: a dataclass for storing a downloaded file (in memory or spilled to disk) with filename, size, and a method 'write_to_file' to write it to disk easily.
 
  ／l、
 （ﾟ､ ｡ ７
@@ -18,12 +28,22 @@ from tqdm import tqdm
 
 from dataclasses import dataclass
 from io import BytesIO
+from typing import IO, Callable, Iterable, Iterator, TypeVar
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import urlsplit, parse_qs
+import base64
+import functools
+import json
+import hashlib
 import os
 
-import requests
+from .records import TrackRecord
+from .library import Library
 
 test_url = "https://soundcloud.com/soundcloud/upload-your-first-track"
 
+session = requests.Session()  # keep-alive connection pool shared by everything
+
 
 def scrape_client_id(src_url: str = test_url) -> str:
     """Attempts to pull client_id from soundcloud URL using BeautifulSoup. Method adapted from https://github.com/3jackdaws/soundcloud-lib/tree/master"""
@@ -42,37 +62,174 @@ def scrape_client_id(src_url: str = test_url) -> str:
     return sorted(parsed_cids, key=lambda v: len(v))[-1]
 
 
-@dataclass
+def load_client_id(filepath: str = "client_id.txt") -> str:
+    """The client_id from filepath if it still works, otherwise a freshly scraped one (saved back to filepath)."""
+    client_id = None
+    if os.path.exists(filepath):
+        with open(filepath, "r") as h:
+            client_id = h.read().strip()
+    if not client_id or not test_client_id(client_id):
+        client_id = scrape_client_id()
+        with open(filepath, "w+") as h:
+            h.write(client_id)
+    return client_id
+
+
+@functools.lru_cache(maxsize=256)
+def fetch_artwork(url: str) -> bytes:
+    response = session.get(url)
+    response.raise_for_status()
+    return response.content
+
+
+def stream_url_expiry(url: str) -> float | None:
+    """Expiry time (epoch seconds) of a signed SC stream URL, None if it can't be worked out.
+    Stream URLs are CloudFront signed, either with Expires=... or a base64 Policy holding DateLessThan."""
+    query = parse_qs(urlsplit(url).query)
+    for key in ("Expires", "expires"):
+        if key in query:
+            try:
+                return float(query[key][0])
+            except ValueError:
+                return None
+    if "Policy" in query:
+        # CloudFront swaps +=/ for -_~ to make the policy URL safe
+        policy = query["Policy"][0].replace("-", "+").replace("_", "=").replace("~", "/")
+        try:
+            statement = json.loads(base64.b64decode(policy))["Statement"][0]
+            return float(statement["Condition"]["DateLessThan"]["AWS:EpochTime"])
+        except (ValueError, KeyError, IndexError, TypeError):
+            return None
+    return None
+
+
+K = TypeVar("K")
+V = TypeVar("V")
+
+
+def prefetched(fetch: Callable[[K], V], keys: Iterable[K]) -> Iterator[V]:
+    """Yields fetch(key) for each key in order, with the fetch for the next key already running in a
+    background thread while the caller works on the current one."""
+    keys = iter(keys)
+    with ThreadPoolExecutor(max_workers=1) as pool:
+        try:
+            future = pool.submit(fetch, next(keys))
+        except StopIteration:
+            return
+        while future is not None:
+            result = future.result()
+            try:
+                future = pool.submit(fetch, next(keys))
+            except StopIteration:
+                future = None
+            yield result
+
+
+@dataclass(init=False)
 class DownloadedTrack:
-    """A container class used to store a file as bytes. This is returned by SCTrack.stream_download().
+    """A container class used to store a downloaded file. This is returned by SCTrack.stream_download().
+    The data lives in a buffer, either a BytesIO or a DownloadBuffer that may have spilled to a temp file,
+    either way it's read the same way.
 
     Attributes
     ----
-    fileobj: the file object, in bytes
+    buffer: the file object holding the data (BytesIO, DownloadBuffer, or bytes which get wrapped).
+        can also be passed as fileobj=, its old name
     filename: given by the user, is literally the filename (not path) with extension
     size: the size in MB of the file
+    record: the TrackRecord it was downloaded from, if any (needed for the library)
+    fileobj: the whole file as bytes (reads it all into memory, prefer write_to_file/open for big files)
+    on_disk: true if the data spilled to a temp file
 
     Methods
     ----
-    write_to_file: writes to a specified directory provided as input ('dir' param defaults to os.getcwd())
+    write_to_file: writes to a specified directory provided as input ('dir' param defaults to os.getcwd()), returns the path.
+        if a Library is given the file is indexed there too (with its sha256 and optionally the set it came from)
+    open: the buffer rewound to the start, for streaming the data somewhere else
+    read: same as fileobj
+    close: frees the buffer (and its memory budget reservation)
     """
 
-    fileobj: bytes
+    buffer: IO[bytes]
     filename: str
     size: float
+    record: TrackRecord | None = None
+
+    def __init__(
+        self,
+        buffer: IO[bytes] | bytes | None = None,
+        filename: str | None = None,
+        size: float | None = None,
+        record: TrackRecord | None = None,
+        *,
+        fileobj: IO[bytes] | bytes | None = None,
+    ) -> None:
+        # fileobj= is what buffer used to be called, DownloadedTrack(fileobj=..., filename=..., size=...) still works
+        if buffer is None:
+            buffer = fileobj
+        if buffer is None or filename is None or size is None:
+            raise TypeError("DownloadedTrack needs buffer (or fileobj), filename and size")
+        self.buffer = BytesIO(buffer) if isinstance(buffer, (bytes, bytearray)) else buffer
+        self.filename = filename
+        self.size = size
+        self.record = record
 
     @classmethod
-    def from_bytesio(cls, trackbuffer: BytesIO, filename: str):
-        fsize: float = trackbuffer.getbuffer().nbytes / 1000000
-        return cls(fileobj=trackbuffer.getvalue(), filename=filename, size=fsize)
-
-    def write_to_file(self, dir: str = os.getcwd()) -> None:
-        with open(os.path.join(dir, self.filename), "w+b") as h:
-            h.write(self.fileobj)
+    def from_bytesio(cls, trackbuffer: IO[bytes], filename: str, record: TrackRecord | None = None):
+        # no copy, the track keeps the buffer. works for any seekable file object, not just BytesIO
+        trackbuffer.seek(0, 2)
+        fsize: float = trackbuffer.tell() / 1000000
+        trackbuffer.seek(0)
+        return cls(buffer=trackbuffer, filename=filename, size=fsize, record=record)
+
+    @property
+    def on_disk(self) -> bool:
+        return getattr(self.buffer, "on_disk", False)
+
+    def open(self) -> IO[bytes]:
+        self.buffer.seek(0)
+        return self.buffer
+
+    def read(self) -> bytes:
+        return self.open().read()
+
+    @property
+    def fileobj(self) -> bytes:
+        return self.read()
+
+    def write_to_file(
+        self,
+        dir: str = os.getcwd(),
+        library: Library | None = None,
+        set_title: str | None = None,
+        set_permalink: str | None = None,
+    ) -> str:
+        path = os.path.join(dir, self.filename)
+        sha256 = hashlib.sha256()
+        src = self.open()
+        with open(path, "w+b") as h:
+            # hash while copying so indexing doesn't need a second pass over the file
+            while chunk := src.read(1024 * 1024):
+                sha256.update(chunk)
+                h.write(chunk)
+        if library is not None and self.record is not None:
+            library.add(
+                self.record,
+                path,
+                os.path.getsize(path),
+                sha256.hexdigest(),
+                set_title=set_title,
+                set_permalink=set_permalink,
+            )
+        return path
+
+    def close(self) -> None:
+        self.buffer.close()
 
     def __repr__(self) -> str:
-        return "DownloadedTrack({}, {} mb)".format(self.filename, round(self.size, 2))
-
+        return "DownloadedTrack({}, {} mb{})".format(
+            self.filename, round(self.size, 2), ", on disk" if self.on_disk else ""
+        )
 
 
 def test_client_id(
@@ -86,7 +243,7 @@ def test_client_id(
         "User-Agent": "Mozilla/5.0 (X11; Linux x86_64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/51.0.2704.103 Safari/537.36"
     }  # anything works rly idk
 
-    response = requests.get(
+    response = session.get(
         "https://api-v2.soundcloud.com/resolve",
         params=test_params,
         headers=test_headers,
@@ -0,0 +1,139 @@
+"""
+transcoding selection stuff
+----
+Transcoding: one entry of resolved['media']['transcodings'], with the codec, protocol and an estimated bitrate
+select_transcoding: picks a transcoding from a list according to a policy
+
+policies:
+* "progressive": progressive stream if there is one, then mp3, then anything (the old behaviour, default)
+* "smallest": lowest estimated bytes (usually opus over HLS)
+* "best": highest estimated bitrate
+* "mp3" / "opus" / "aac": that codec specifically, smallest first if there are several
+
+only protocols the downloader can handle are ever picked, DRM variants ("ctr-encrypted-hls", "cbc-encrypted-hls")
+would just download as ciphertext.
+"""
+
+from dataclasses import dataclass
+
+PROGRESSIVE_FIRST = "progressive"
+SMALLEST = "smallest"
+BEST = "best"
+CODECS = ("mp3", "opus", "aac")
+POLICIES = (PROGRESSIVE_FIRST, SMALLEST, BEST) + CODECS
+SUPPORTED_PROTOCOLS = ("progressive", "hls")
+
+# nominal bitrates in kbps, SC doesn't give us these so they're from the presets
+PRESET_BITRATES: dict[str, int] = {
+    "mp3_0_0": 128,
+    "mp3_0_1": 128,
+    "mp3_1_0": 128,
+    "mp3_standard": 128,
+    "opus_0_0": 64,
+    "aac_160k": 160,
+    "aac_1_0": 256,
+    "aac_hq": 256,
+}
+CODEC_BITRATES: dict[str, int] = {"mp3": 128, "opus": 64, "aac": 160}
+
+EXTENSIONS: dict[str, str] = {"mp3": "mp3", "opus": "opus", "aac": "m4a"}
+
+
+def estimate_bytes(duration_ms: int, bitrate_kbps: int) -> int:
+    """Rough size of a stream in bytes from its duration (ms) and bitrate (kbps)."""
+    return int(duration_ms / 1000 * bitrate_kbps * 1000 / 8)
+
+
+@dataclass(slots=True, frozen=True)
+class Transcoding:
+    """A single transcoding of a track. Build with Transcoding.from_json(resolved['media']['transcodings'][i])"""
+
+    url: str
+    preset: str
+    protocol: str
+    mime_type: str
+    quality: str
+    duration: int  # ms
+    snipped: bool = False
+
+    @classmethod
+    def from_json(cls, tr: dict) -> "Transcoding":
+        return cls(
+            url=tr["url"],
+            preset=tr.get("preset", ""),
+            protocol=tr["format"]["protocol"],
+            mime_type=tr["format"].get("mime_type", ""),
+            quality=tr.get("quality", "sq"),
+            duration=tr.get("duration") or 0,
+            snipped=tr.get("snipped", False),
+        )
+
+    @property
+    def codec(self) -> str:
+        for codec in CODECS:
+            if self.preset.startswith(codec):
+                return codec
+        if "opus" in self.mime_type:
+            return "opus"
+        if "mp4" in self.mime_type:
+            return "aac"
+        return "mp3"
+
+    @property
+    def progressive(self) -> bool:
+        return self.protocol == "progressive"
+
+    @property
+    def supported(self) -> bool:
+        # plain progressive or HLS, not the encrypted (DRM) HLS variants
+        return self.protocol in SUPPORTED_PROTOCOLS
+
+    @property
+    def extension(self) -> str:
+        return EXTENSIONS[self.codec]
+
+    @property
+    def bitrate(self) -> int:
+        """Estimated bitrate in kbps"""
+        if self.preset in PRESET_BITRATES:
+            return PRESET_BITRATES[self.preset]
+        bitrate = CODEC_BITRATES[self.codec]
+        return bitrate * 2 if self.quality == "hq" else bitrate
+
+    @property
+    def estimated_bytes(self) -> int:
+        return estimate_bytes(self.duration, self.bitrate)
+
+
+def select_transcoding(
+    transcodings: list[Transcoding], policy: str = PROGRESSIVE_FIRST
+) -> Transcoding | None:
+    """Picks a transcoding according to policy (see module docstring). Returns None if nothing matches.
+    Unsupported (encrypted) protocols are never picked, snipped (preview) transcodings only if there's nothing else."""
+    if policy not in POLICIES:
+        raise ValueError(f"Unknown transcoding policy {policy!r}, expected one of {POLICIES}")
+
+    usable = [tr for tr in transcodings if tr.supported]
+    full = [tr for tr in usable if not tr.snipped]
+    candidates = full or usable
+    if not candidates:
+        return None
+
+    if policy == PROGRESSIVE_FIRST:
+        # same order as before: last progressive, else last mp3, else whatever is there
+        progressive = [tr for tr in candidates if tr.progressive]
+        if progressive:
+            return progressive[-1]
+        mp3 = [tr for tr in candidates if tr.codec == "mp3"]
+        return (mp3 or candidates)[-1]
+
+    if policy == SMALLEST:
+        return min(candidates, key=lambda tr: (tr.bitrate, not tr.progressive))
+
+    if policy == BEST:
+        return max(candidates, key=lambda tr: (tr.bitrate, tr.progressive))
+
+    matching = [tr for tr in candidates if tr.codec == policy]
+    if not matching:
+        return None
+    return min(matching, key=lambda tr: (tr.bitrate, not tr.progressive))
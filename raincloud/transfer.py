@@ -0,0 +1,165 @@
+"""
+the actual byte copying for downloads
+----
+copy_response: reads a streamed requests response into a file object with an AdaptiveChunker picking the read size,
+so fast links do a few big reads instead of thousands of 8 KB iter_content chunks (each with Python overhead)
+
+AdaptiveChunker: grows the read size while reads finish quickly, shrinks it when they get slow
+
+segmented_download: fetches a progressive file as N byte ranges over parallel connections into a preallocated
+buffer, for long mixes where one CDN connection is way slower than the link. falls back to a single stream when
+the server ignores Range
+"""
+
+import re
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import IO, Callable
+
+import requests
+
+from .exceptions import IncompleteDownloadError
+from .progress import ProgressReporter
+
+KB = 1024
+MB = 1024 * KB
+
+
+class AdaptiveChunker:
+    """Aims for each read to take around `target` seconds at the measured throughput,
+    so per-chunk overhead stays small on fast links and progress stays smooth on slow ones.
+    Sizes are powers of two between minimum and maximum and move by one doubling/halving per read."""
+
+    def __init__(self, initial: int = 64 * KB, minimum: int = 16 * KB, maximum: int = 8 * MB, target: float = 0.1):
+        self.minimum = minimum
+        self.maximum = maximum
+        self.target = target
+        self.size = max(minimum, min(initial, maximum))
+        self.rate = 0.0  # bytes/s, exponentially smoothed
+
+    def record(self, nbytes: int, seconds: float) -> None:
+        if seconds <= 0:
+            seconds = 1e-6
+        rate = nbytes / seconds
+        self.rate = rate if self.rate == 0 else 0.7 * self.rate + 0.3 * rate
+        ideal = self.rate * self.target
+        if ideal > self.size * 2 and self.size < self.maximum:
+            self.size *= 2
+        elif ideal < self.size / 2 and self.size > self.minimum:
+            self.size //= 2
+
+
+def copy_response(
+    response: requests.Response,
+    fileobj: IO[bytes],
+    reporter: ProgressReporter | None = None,
+    chunker: AdaptiveChunker | None = None,
+    pace: Callable[[int, float], None] | None = None,
+) -> int:
+    """Copies a stream=True response body into fileobj, returns bytes copied.
+    pace(nbytes, seconds) is called after every read, the scheduler uses it to slow down low priority downloads."""
+    chunker = chunker or AdaptiveChunker()
+    raw = response.raw
+    copied = 0
+    while True:
+        t0 = time.perf_counter()
+        chunk = raw.read(chunker.size, decode_content=True)
+        if not chunk:
+            break
+        chunker.record(len(chunk), time.perf_counter() - t0)
+        fileobj.write(chunk)
+        copied += len(chunk)
+        if reporter is not None:
+            reporter.update(len(chunk))
+        if pace is not None:
+            pace(len(chunk), time.perf_counter() - t0)
+    return copied
+
+
+class _LockedWriter:
+    """Lets several threads write at their own offsets into one file object."""
+
+    def __init__(self, fileobj: IO[bytes], offset: int, lock: threading.Lock):
+        self.fileobj = fileobj
+        self.offset = offset
+        self.lock = lock
+
+    def write(self, chunk: bytes) -> None:
+        with self.lock:
+            self.fileobj.seek(self.offset)
+            self.fileobj.write(chunk)
+        self.offset += len(chunk)
+
+
+class _LockedReporter:
+    """One ProgressReporter fed by several threads."""
+
+    def __init__(self, reporter: ProgressReporter):
+        self.reporter = reporter
+        self.lock = threading.Lock()
+
+    def update(self, n: int) -> None:
+        with self.lock:
+            self.reporter.update(n)
+
+
+def segmented_download(
+    url: str,
+    fileobj: IO[bytes],
+    connections: int = 4,
+    reporter: ProgressReporter | None = None,
+    pace: Callable[[int, float], None] | None = None,
+    http: requests.Session | None = None,
+    min_part: int = 1 * MB,
+) -> int:
+    """Downloads url into fileobj using up to `connections` parallel ranged requests, returns the size.
+    A `Range: bytes=0-0` probe gets the total size, if the server answers 200 instead of 206 that response
+    is just streamed as usual. The final size is checked against the server's, IncompleteDownloadError if off."""
+    http = http or requests.Session()
+    probe = http.get(url, headers={"Range": "bytes=0-0"}, stream=True)
+    probe.raise_for_status()
+    match = re.match(r"bytes 0-0/(\d+)", probe.headers.get("content-range", ""))
+    if probe.status_code != 206 or match is None:
+        # no range support, the probe is the whole file
+        expected = int(probe.headers.get("content-length", 0))
+        if reporter is not None and reporter.total is None:
+            reporter.total = expected or None
+        copied = copy_response(probe, fileobj, reporter, pace=pace)
+        if expected and copied != expected:
+            raise IncompleteDownloadError("got {} of {} bytes from {}".format(copied, expected, url))
+        return copied
+    probe.close()
+
+    size = int(match.group(1))
+    if reporter is not None:
+        reporter.total = size
+    parts = max(1, min(connections, size // min_part))
+    bounds = [(size * i // parts, size * (i + 1) // parts - 1) for i in range(parts)]
+
+    # preallocate so every part can write at its offset straight away (DownloadBuffers spill to disk as needed)
+    start = fileobj.tell()
+    if size:
+        fileobj.seek(start + size - 1)
+        fileobj.write(b"\0")
+
+    lock = threading.Lock()
+    shared_reporter = _LockedReporter(reporter) if reporter is not None else None
+
+    def fetch(first: int, last: int) -> int:
+        response = http.get(url, headers={"Range": f"bytes={first}-{last}"}, stream=True)
+        response.raise_for_status()
+        if response.status_code != 206:
+            raise IncompleteDownloadError("server stopped honouring Range for {}".format(url))
+        got = copy_response(response, _LockedWriter(fileobj, start + first, lock), shared_reporter, pace=pace)
+        if got != last - first + 1:
+            raise IncompleteDownloadError("range {}-{} of {}: got {} bytes".format(first, last, url, got))
+        return got
+
+    with ThreadPoolExecutor(max_workers=parts) as pool:
+        total = sum(pool.map(lambda b: fetch(*b), bounds))
+
+    if total != size:
+        raise IncompleteDownloadError("got {} of {} bytes from {}".format(total, size, url))
+    fileobj.seek(start + size)
+    return size
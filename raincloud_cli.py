@@ -1,17 +1,44 @@
 import argparse
-from raincloud import SCTrack, SCSet
-from raincloud.shared import test_client_id, scrape_client_id
-from raincloud.exceptions import TrackSetMismatchError
+from raincloud import SCTrack, SCSet, SCLikes, SCUserTracks, SCReposts
+from raincloud.shared import load_client_id
+from raincloud.exceptions import TrackSetMismatchError, TrackUnavailableError
+from raincloud.transcoding import POLICIES, PROGRESSIVE_FIRST
+from raincloud.library import Library
+from raincloud.progress import TqdmProgress
+from raincloud.scheduler import BULK
+from raincloud.daemon import DaemonClient
+from raincloud.exceptions import DaemonJobError
+from raincloud.postprocess import PostProcessor
+from raincloud.negcache import NegativeCache, set_negative_cache
 import os
 
-client_id_filepath = "client_id.txt"
-with open(client_id_filepath, "r") as client_id_txt:
-    client_id = client_id_txt.read().strip()
 
-if not test_client_id(client_id):
-    client_id = scrape_client_id()
-    with open(client_id_filepath, 'w+') as h:
-        h.write(client_id)
+def run_on_daemon(daemon: DaemonClient, args: argparse.Namespace) -> bool:
+    """thin client: the daemon already has a validated client_id, warm connections and caches.
+    False if the daemon won't take the job (e.g. the cwd is outside its download roots), then it runs here instead"""
+    job = {"url": args.sc_url, "format": args.format}
+    try:
+        resolved = daemon.wait(daemon.submit("resolve", **job))
+        if resolved["kind"] == "set":
+            cont = input("Playlist/set detected ({} tracks). Would you like to download all? (Y/n)".format(len(resolved["tracks"])))
+            if cont.lower() != "y":
+                return True
+            args.set_confirmed = True  # don't ask again if it ends up running here
+        result = daemon.wait(
+            daemon.submit("download", dir=os.getcwd(), metadata=(not args.nm), connections=args.connections, **job)
+        )
+    except ValueError as e:
+        print(f"the daemon won't take this job ({e}), running it here")
+        return False
+    except DaemonJobError as e:
+        if e.reason is None:
+            raise
+        print(f"couldn't download {args.sc_url}: {e}")  # same as an unavailable track in-process
+        return True
+    for path in result["paths"]:
+        print(f"saved {path}")
+    return True
+
 
 if __name__ == "__main__":
     parser = argparse.ArgumentParser(description="simple soundcloud downloader")
@@ -19,8 +46,8 @@ if __name__ == "__main__":
     parser.add_argument(
         "--cid",
         type=str,
-        default=client_id,
-        help="soundcloud client ID, can be obtained via F12 on refresh.",
+        default=None,
+        help="soundcloud client ID, can be obtained via F12 on refresh. read from client_id.txt (or scraped) if not given",
     )
     parser.add_argument(
         "--nm",
@@ -28,28 +55,97 @@ if __name__ == "__main__":
         action="store_true",
         help="just download mp3, no metadata",
     )
+    parser.add_argument(
+        "--format",
+        choices=POLICIES,
+        default=PROGRESSIVE_FIRST,
+        help="which transcoding to download, e.g. 'smallest' on metered links",
+    )
+    parser.add_argument(
+        "--library",
+        type=str,
+        default="library.db",
+        help="library index of downloaded tracks, anything already in it is skipped",
+    )
+    parser.add_argument(
+        "--connections",
+        type=int,
+        default=1,
+        help="parallel connections for a progressive track download (ranged requests), helps with long mixes",
+    )
+    parser.add_argument(
+        "--negative-cache",
+        type=str,
+        default="negative_cache.json",
+        help="where unavailable/failed tracks are remembered, so they're skipped for a while instead of retried",
+    )
+    parser.add_argument(
+        "--retry-failed",
+        default=False,
+        action="store_true",
+        help="forget remembered failures and try those tracks again (runs in this process, not on the daemon)",
+    )
+    parser.add_argument(
+        "--no-daemon",
+        default=False,
+        action="store_true",
+        help="don't use a running raincloud daemon (python -m raincloud), do everything in this process",
+    )
     args = parser.parse_args()
 
+    daemon = DaemonClient()
+    args.set_confirmed = False
+    if not args.no_daemon and args.cid is None and not args.retry_failed and daemon.available():
+        if run_on_daemon(daemon, args):
+            raise SystemExit
+
     os.makedirs("dls", exist_ok=True)
-    client_id: str = args.cid
+    client_id: str = args.cid or load_client_id()
     download_completed: bool = False
+    library = Library(args.library)
+    progress = TqdmProgress()
+    negative_cache = set_negative_cache(NegativeCache(args.negative_cache))
+    if args.retry_failed:
+        negative_cache.clear()
+
+    if library.has(args.sc_url):
+        print(f"already downloaded: {library.get(args.sc_url).path}")
+        download_completed = True
+
+    # user collections are paginated, downloads start as soon as the first page is in
+    collections = {"/likes": SCLikes, "/tracks": SCUserTracks, "/reposts": SCReposts}
+    for suffix, collection_cls in collections.items():
+        if args.sc_url.rstrip("/").endswith(suffix):
+            for track in collection_cls(client_id, args.sc_url, args.format):
+                if library.has(track.record.id):
+                    continue
+                try:
+                    dt = track.stream_download(metadata=(not args.nm), progress=progress, priority=BULK, job=args.sc_url)
+                except TrackUnavailableError as e:
+                    print(f"skipped {track.record.permalink}: {e}")
+                    continue
+                dt.write_to_file(library=library)
+            download_completed = True
 
     while not download_completed:
         try:
-            sc = SCTrack(client_id, args.sc_url)
+            sc = SCTrack(client_id, args.sc_url, args.format)
             stream_url = sc.stream_url
-            dt = sc.stream_download(metadata=(not args.nm))
-            dt.write_to_file()
+            dt = sc.stream_download(metadata=(not args.nm), progress=progress, connections=args.connections)
+            dt.write_to_file(library=library)
+            download_completed = True
+
+        except TrackUnavailableError as e:
+            print(f"couldn't download {args.sc_url}: {e}")
             download_completed = True
 
         except TrackSetMismatchError as e:
-            cont = input("Playlist/set detected. Would you like to download all? (Y/n)")
+            cont = "y" if args.set_confirmed else input("Playlist/set detected. Would you like to download all? (Y/n)")
             if cont.lower() == "y":
-                set = SCSet(client_id, args.sc_url)
-                for track in set.tracks:
-                    dt = track.stream_download()
-                    dt.write_to_file()
+                set = SCSet(client_id, args.sc_url, args.format)
+                print(f"estimated size: {round(set.estimated_size / (1024*1024), 2)} MB")
+                with PostProcessor() as post:
+                    set.download_all(os.getcwd(), metadata=(not args.nm), library=library, progress=progress, postprocessor=post)
             else:
                 ...
             download_completed = True
-            
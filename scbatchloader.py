@@ -1,9 +1,11 @@
 from raincloud import SCTrack, SCSet
-from raincloud.shared import scrape_client_id, test_client_id
-from raincloud.exceptions import TrackSetMismatchError
+from raincloud.shared import load_client_id, stream_url_expiry
+from raincloud.exceptions import TrackSetMismatchError, TrackUnavailableError
+from raincloud.negcache import NegativeCache, set_negative_cache
+from raincloud.library import Library
 
 from PySide6 import QtWidgets as qtw
-from PySide6.QtCore import Qt, QSize, QPoint
+from PySide6.QtCore import Qt, QSize, QPoint, QObject, QTimer, Signal
 import PySide6.QtGui as qtg
 
 import pandas as pd
@@ -12,25 +14,21 @@ import sys
 import subprocess
 import json
 import os
+import time
+from concurrent.futures import ThreadPoolExecutor
 
 from typing import Any, Iterator, Generator
 
 
-if os.path.exists('client_id.txt'):
-    cid = open('client_id.txt').read()
-    if not test_client_id(cid):
-        cid = scrape_client_id()
-else:
-    cid = scrape_client_id()
-
-with open('client_id.txt', 'w+') as h:
-    h.write(cid)
+cid = load_client_id()
 
 
 
 DEFAULT_CFG: dict = {
     'metadata': True,
-    'player_cmd': 'audacious'
+    'player_cmd': 'audacious',
+    'library': 'library.db',
+    'negative_cache': 'negative_cache.json',
 }
 
 class SCASettingsDialog(qtw.QDialog):
@@ -91,6 +89,73 @@ class ResolvedViewer(qtw.QDialog):
 
         self.setLayout(lt)
 
+class StreamRefresher(QObject):
+    """Fetches stream URLs in a thread pool instead of on the GUI thread, and re-fetches each one a bit before
+    its signed URL expires. Results come back through the `refreshed` signal (track, url) on the GUI thread."""
+
+    refreshed = Signal(object, str)
+    failed = Signal(object, str)
+
+    def __init__(self, parent: QObject | None = None, workers: int = 8, margin: float = 60, fallback_ttl: float = 20 * 60) -> None:
+        super().__init__(parent)
+        self.pool = ThreadPoolExecutor(max_workers=workers)
+        self.margin = margin # seconds before expiry to refresh
+        self.fallback_ttl = fallback_ttl # for URLs we can't read an expiry from
+        self.expiries: dict[int, float] = {} # id(track) -> when to refresh
+        self.pending: set[int] = set()
+        self.tracks: dict[int, "SCTrack"] = {}
+
+        self.refreshed.connect(self._on_refreshed)
+        self.failed.connect(self._on_failed)
+
+        self.timer = QTimer(self)
+        self.timer.setInterval(15 * 1000)
+        self.timer.timeout.connect(self.refresh_due)
+        self.timer.start()
+
+    def _fetch(self, track: "SCTrack") -> None:
+        try:
+            url = track.stream_url
+        except Exception as e:
+            self.failed.emit(track, str(e))
+        else:
+            self.refreshed.emit(track, url)
+
+    def _on_refreshed(self, track: "SCTrack", url: str) -> None:
+        key = id(track)
+        self.pending.discard(key)
+        if key in self.tracks:
+            expiry = stream_url_expiry(url) or time.time() + self.fallback_ttl
+            self.expiries[key] = expiry - self.margin
+
+    def _on_failed(self, track: "SCTrack", error: str) -> None:
+        key = id(track)
+        self.pending.discard(key)
+        if key in self.tracks:
+            self.expiries[key] = time.time() + self.margin # try again in a bit
+
+    def refresh(self, tracks: list["SCTrack"]) -> None:
+        for track in tracks:
+            key = id(track)
+            self.tracks[key] = track
+            if key not in self.pending:
+                self.pending.add(key)
+                self.pool.submit(self._fetch, track)
+
+    def refresh_due(self) -> None:
+        now = time.time()
+        self.refresh([self.tracks[k] for k, t in self.expiries.items() if t <= now and k in self.tracks])
+
+    def forget(self, track: "SCTrack") -> None:
+        key = id(track)
+        self.tracks.pop(key, None)
+        self.expiries.pop(key, None)
+
+    def forget_all(self) -> None:
+        self.tracks.clear()
+        self.expiries.clear()
+
+
 class SCBatchLoader(qtw.QWidget):
     def __init__(self, client_id: str, cfg: dict = DEFAULT_CFG) -> None:
         super().__init__()
@@ -104,6 +169,13 @@ class SCBatchLoader(qtw.QWidget):
         self.track_counter: int = 0
 
         self.cfg = cfg
+        self.library = Library(self.cfg.get('library', DEFAULT_CFG['library']))
+        # unavailable tracks are remembered, sets skip them instead of failing on them every time
+        set_negative_cache(NegativeCache(self.cfg.get('negative_cache', DEFAULT_CFG['negative_cache'])))
+
+        self.refresher = StreamRefresher(self)
+        self.refresher.refreshed.connect(self.stream_refreshed)
+        self.refresher.failed.connect(self.stream_refresh_failed)
 
         self.initUi()
 
@@ -179,19 +251,24 @@ class SCBatchLoader(qtw.QWidget):
 
         self.setFixedSize(self.sizeHint())
 
+    def add_track(self, sc_track: SCTrack) -> None:
+        # stream URL is filled in by the refresher in the background
+        item = qtw.QTreeWidgetItem([sc_track.title, "fetching..."])
+        item.setData(0, Qt.UserRole, self.track_counter)
+
+        self.track_counter += 1
+        self.tree.addTopLevelItem(item)
+
+        self.tracks.append(sc_track)
+        self.urls.append(None)
+        self.refresher.refresh([sc_track])
+
     def add_url(self) -> None:
         url: str = self.url_entry.text()
         try:
             sc_track = SCTrack(self.client_id, url)
-            if sc_track.resolved['permalink_url'] not in [t.resolved['permalink_url'] for t in self.tracks]:
-                item = qtw.QTreeWidgetItem([sc_track.title, sc_track.stream_url])
-                item.setData(0, Qt.UserRole, self.track_counter)
-
-                self.track_counter += 1
-                self.tree.addTopLevelItem(item)
-
-                self.tracks.append(sc_track)
-                self.urls.append(sc_track.stream_url)
+            if sc_track.record.permalink not in [t.record.permalink for t in self.tracks]:
+                self.add_track(sc_track)
         except TrackSetMismatchError as e:
             info = qtw.QMessageBox(self)
             info.setWindowTitle("parsing SCSet")
@@ -199,15 +276,8 @@ class SCBatchLoader(qtw.QWidget):
             info.exec()
             tracks = SCSet(self.client_id, url).tracks
             for sc_track in tracks:
-                if sc_track.resolved['permalink_url'] not in [t.resolved['permalink_url'] for t in self.tracks]:
-                    item = qtw.QTreeWidgetItem([sc_track.title, sc_track.stream_url])
-                    item.setData(0, Qt.UserRole, self.track_counter)
-
-                    self.track_counter += 1
-                    self.tree.addTopLevelItem(item)
-
-                    self.tracks.append(sc_track)
-                    self.urls.append(sc_track.stream_url)
+                if sc_track.record.permalink not in [t.record.permalink for t in self.tracks]:
+                    self.add_track(sc_track)
         except Exception as e:
             errormsg = qtw.QMessageBox(self)
             errormsg.setText(str(e))
@@ -225,10 +295,15 @@ class SCBatchLoader(qtw.QWidget):
                 info.setText("ermmmm")
                 info.exec()
                 return False
+            skipped: list[str] = []
             for track in self.tracks:
+                if self.library.has(track.record.id):
+                    continue # already downloaded, no need to hit the network
                 try:
                     dl = track.stream_download(self.cfg['metadata'])
-                    dl.write_to_file(dst)
+                    dl.write_to_file(dst, self.library)
+                except TrackUnavailableError as e:
+                    skipped.append("{} ({})".format(track.record.title, e.reason)) # one summary instead of a popup each
                 except Exception as e:
                     errormsg = qtw.QMessageBox(self)
                     errormsg.setText(str(e))
@@ -236,7 +311,10 @@ class SCBatchLoader(qtw.QWidget):
 
             success = qtw.QMessageBox(self)
             success.setWindowTitle("downloaded all tracks")
-            success.setText("all tracks saved to {}".format(dst))
+            text = "all tracks saved to {}".format(dst)
+            if skipped:
+                text += "\n\nskipped (unavailable):\n" + "\n".join(skipped)
+            success.setText(text)
             success.exec()
             return True
         else:
@@ -249,7 +327,7 @@ class SCBatchLoader(qtw.QWidget):
     def open_player(self) -> None:
         try:
             cmd = [self.cfg['player_cmd']]
-            cmd.extend(self.urls)
+            cmd.extend(u for u in self.urls if u is not None)
             subprocess.Popen(cmd, stdout=subprocess.DEVNULL)
         except Exception as e:
             errormsg = qtw.QMessageBox(self)
@@ -288,6 +366,7 @@ class SCBatchLoader(qtw.QWidget):
             button = confirm.exec()
 
             if button == qtw.QMessageBox.StandardButton.Yes:
+                self.refresher.forget_all()
                 self.tree.clear()
                 self.tracks = []
                 self.urls = []
@@ -335,6 +414,7 @@ class SCBatchLoader(qtw.QWidget):
 
     def delete_track(self, item: qtw.QTreeWidgetItem) -> None:
         idx = item.data(0, Qt.UserRole)
+        self.refresher.forget(self.tracks[idx])
         del self.tracks[idx]
         del self.urls[idx]
         self.tree.takeTopLevelItem(self.tree.indexOfTopLevelItem(item))
@@ -348,6 +428,8 @@ class SCBatchLoader(qtw.QWidget):
     def copy_stream_url(self, item: qtw.QTreeWidgetItem) -> None:
         idx = item.data(0, Qt.UserRole)
         try:
+            if self.urls[idx] is None:
+                raise ValueError("stream URL is still being fetched")
             from pyperclip import copy
             copy(self.urls[idx])
             success = qtw.QMessageBox(self)
@@ -369,7 +451,7 @@ class SCBatchLoader(qtw.QWidget):
         idx = item.data(0, Qt.UserRole)
         try:
             from pyperclip import copy
-            permalink = self.tracks[idx].resolved['permalink_url']
+            permalink = self.tracks[idx].record.permalink
             copy(permalink)
             success = qtw.QMessageBox(self)
             success.setWindowTitle("copied")
@@ -391,12 +473,19 @@ class SCBatchLoader(qtw.QWidget):
         idx = item.data(0, Qt.UserRole)
 
         sc_track = self.tracks[idx]
+        if self.library.has(sc_track.record.id):
+            info = qtw.QMessageBox(self)
+            info.setWindowTitle("already downloaded")
+            info.setText("{} is already at {}".format(sc_track.title, self.library.get(sc_track.record.id).path))
+            info.exec()
+            return
+
         dst: str = qtw.QFileDialog.getExistingDirectory()
         dst = str(dst) # ???
 
         try:
             dl = sc_track.stream_download(self.cfg['metadata'])
-            dl.write_to_file(dst)
+            dl.write_to_file(dst, self.library)
             success = qtw.QMessageBox(self)
             success.setWindowTitle("downloaded track")
             success.setText("{} saved to {}".format(sc_track.title, dst))
@@ -407,12 +496,26 @@ class SCBatchLoader(qtw.QWidget):
             errormsg.exec()
 
     def refresh_streams(self) -> None:
-        self.urls = [t.stream_url for t in self.tracks]
+        self.refresher.refresh(self.tracks)
         info = qtw.QMessageBox(self)
-        info.setWindowTitle("streams refreshed")
-        info.setText("streaming URLs should be updated.") # How to refresh the tree view as well iteratively
+        info.setWindowTitle("refreshing streams")
+        info.setText("refreshing {} streaming URLs in the background.".format(len(self.tracks)))
         info.exec()
 
+    def stream_refreshed(self, track: SCTrack, url: str) -> None:
+        # find by identity, indices shift when tracks get deleted
+        for idx, t in enumerate(self.tracks):
+            if t is track:
+                self.urls[idx] = url
+                self.tree.topLevelItem(idx).setText(1, url)
+                return
+
+    def stream_refresh_failed(self, track: SCTrack, error: str) -> None:
+        for idx, t in enumerate(self.tracks):
+            if t is track:
+                self.tree.topLevelItem(idx).setText(1, "error: {}".format(error))
+                return
+
     def show_about(self) -> None:
         info = qtw.QMessageBox(self)
         info.setWindowTitle("about")
@@ -1,28 +1,16 @@
 import streamlit as st
-from raincloud import SCTrack, SCSet
-from raincloud.shared import scrape_client_id, test_client_id
+from raincloud.daemon import run_job
+import tempfile
 import os
 
 st.header("RAINCLOUD")
 
 ph = st.empty()
 
-if not os.path.exists("client_id.txt"):
-    with open("client_id.txt", "w+") as f:
-        with ph.container():
-            st.info("scraping client_id...")
-            f.write(scrape_client_id())
-        ph.empty()
-
-client_id: str = open("client_id.txt").read()
-if not test_client_id(client_id):
-    with ph.container():
-        st.info("scraping client_id...")
-        client_id = scrape_client_id()
-    ph.empty()
-        
-    with open("client_id.txt", "w+") as f:
-        f.write(client_id)
+# downloads go through the raincloud daemon if it's running (warm client_id, connections, caches),
+# otherwise they run in this process and the client_id gets checked/scraped the first time. the in-process runner
+# lives at module level in raincloud.daemon, so it stays warm across streamlit reruns (resolve + download share it)
+download_dir = os.path.join(tempfile.gettempdir(), "raincloud")
 
 soundcloud_url = st.text_input(label="SC URL to download...", key='sc_url')
 
@@ -32,10 +20,14 @@ def clear_url_entry():
 if soundcloud_url:
     with ph.container():
         st.info('downloading track...')
-        t = SCTrack(client_id, soundcloud_url)
-        dt = t.stream_download()
+        t = run_job("resolve", url=soundcloud_url)
+        if t["kind"] == "track":
+            dt = run_job("download", url=soundcloud_url, dir=download_dir)
     ph.empty()
-    st.success('Sucessfully downloaded track {} ({} mb)'.format(t.title, dt.size))
-    st.download_button(label="Download", data=dt.fileobj, file_name=f"{t.title}.mp3", on_click=clear_url_entry)
-
-
+    if t["kind"] != "track":
+        st.error("that's a {}, only single tracks can be downloaded here".format(t["kind"]))
+    else:
+        path = dt["paths"][0]
+        st.success('Sucessfully downloaded track {} ({} mb)'.format(t["title"], round(os.path.getsize(path) / 1000000, 2)))
+        with open(path, "rb") as h:
+            st.download_button(label="Download", data=h.read(), file_name=f"{t['title']}.{path.rsplit('.', 1)[-1]}", on_click=clear_url_entry)
@@ -0,0 +1,72 @@
+import threading
+import time
+
+from raincloud.scheduler import BULK, DownloadScheduler
+
+
+def _hold(scheduler, job, started, release, order=None):
+    with scheduler.slot(BULK, job):
+        if order is not None:
+            order.append(job)
+        started.set()
+        release.wait(5)
+
+
+def test_job_with_fewest_slots_goes_first():
+    scheduler = DownloadScheduler(slots=3, reserved=0)
+    release = {job: threading.Event() for job in ("a1", "a2", "b")}
+    threads = []
+    for name, job in (("a1", "a"), ("a2", "a"), ("b", "b")):
+        started = threading.Event()
+        threads.append(threading.Thread(target=_hold, args=(scheduler, job, started, release[name])))
+        threads[-1].start()
+        assert started.wait(5)
+
+    # a (2 slots) queues before c (0 slots), c should still get the next free slot
+    order: list[str] = []
+    done = threading.Event()
+    waiters = []
+    for job in ("a", "c"):
+        waiters.append(threading.Thread(target=_hold, args=(scheduler, job, threading.Event(), done, order)))
+        waiters[-1].start()
+        time.sleep(0.05)
+
+    release["b"].set()
+    deadline = time.monotonic() + 5
+    while not order and time.monotonic() < deadline:
+        time.sleep(0.01)
+    assert order[:1] == ["c"]
+
+    done.set()
+    for event in release.values():
+        event.set()
+    for t in threads + waiters:
+        t.join(5)
+    assert scheduler.active == 0
+
+
+def test_aging_still_lets_old_waiters_through():
+    scheduler = DownloadScheduler(slots=1, reserved=0, aging=0.05)
+    started, release, order = threading.Event(), threading.Event(), []
+    holder = threading.Thread(target=_hold, args=(scheduler, "a", started, release))
+    holder.start()
+    assert started.wait(5)
+
+    # b has been waiting two aging levels, a fresh waiter for a job with no slots doesn't overtake it
+    done = threading.Event()
+    old = threading.Thread(target=_hold, args=(scheduler, "b", threading.Event(), done, order))
+    old.start()
+    time.sleep(0.12)
+    new = threading.Thread(target=_hold, args=(scheduler, "c", threading.Event(), done, order))
+    new.start()
+    time.sleep(0.01)
+
+    release.set()
+    deadline = time.monotonic() + 5
+    while not order and time.monotonic() < deadline:
+        time.sleep(0.01)
+    assert order[:1] == ["b"]
+
+    done.set()
+    for t in (holder, old, new):
+        t.join(5)